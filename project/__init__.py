@@ -1,26 +1,42 @@
-from .task9 import cfpq_with_gll
-from .task8 import cfpq_with_tensor, cfg_to_rsm, ebnf_to_rsm
-from .task7 import cfpq_with_matrix
-from .task6 import cfg_to_weak_normal_form, cfpq_with_hellings
-from .task4 import reachability_with_constraints
-from .task3 import intersect_automata, FiniteAutomaton
-from .task2 import regex_to_dfa, graph_to_nfa
-from .task_1 import graph_info, create_labeled_two_cycle_graph
+import importlib
 
+# public name -> module that defines it; modules are imported on first
+# attribute access so that `import project` stays cheap
+_exports = {
+    "graph_info": "task_1",
+    "create_labeled_two_cycle_graph": "task_1",
+    "regex_to_dfa": "task2",
+    "graph_to_nfa": "task2",
+    "intersect_automata": "task3",
+    "FiniteAutomaton": "task3",
+    "reachability_with_constraints": "task4",
+    "rpq": "task5",
+    "cfg_to_weak_normal_form": "task6",
+    "cfpq_with_hellings": "task6",
+    "iter_cfpq_with_hellings": "task6",
+    "cfpq_with_matrix": "task7",
+    "iter_cfpq_with_matrix": "task7",
+    "cfpq_with_tensor": "task8",
+    "iter_cfpq_with_tensor": "task8",
+    "cfg_to_rsm": "task8",
+    "ebnf_to_rsm": "task8",
+    "cfpq_with_gll": "task9",
+    "iter_cfpq_with_gll": "task9",
+    "typing_program": "task12",
+    "exec_program": "task12",
+    "explain_program": "task12",
+}
 
-__all__ = [
-    "graph_info",
-    "create_labeled_two_cycle_graph",
-    "regex_to_dfa",
-    "graph_to_nfa",
-    "intersect_automata",
-    "FiniteAutomaton",
-    "reachability_with_constraints",
-    "cfg_to_weak_normal_form",
-    "cfpq_with_hellings",
-    "cfpq_with_matrix",
-    "cfpq_with_tensor",
-    "cfg_to_rsm",
-    "ebnf_to_rsm",
-    "cfpq_with_gll",
-]
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_exports[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
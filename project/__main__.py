@@ -1 +0,0 @@
-print("exec sources directory")
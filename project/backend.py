@@ -0,0 +1,217 @@
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from project.bitmatrix import BitMatrix, four_russians_matmul
+
+
+class SparseBackend:
+    """
+    Boolean matrices kept in one scipy.sparse format. Arithmetic on LIL
+    matrices yields CSR in scipy, so "lil" only changes how operands are
+    built. Products of operands that are both at least
+    dense_product_density dense go through the Four Russians kernel on
+    packed bits; None keeps every product in scipy.
+    """
+
+    def __init__(self, format: str, dense_product_density: Optional[float] = 0.05):
+        self.name = format
+        self.dense_product_density = dense_product_density
+
+    def matrix(self, rows, cols, shape: tuple[int, int]):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        return sp.coo_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)), shape=shape, dtype=bool
+        ).asformat(self.name)
+
+    def zeros(self, shape: tuple[int, int]):
+        return self.matrix([], [], shape)
+
+    def eye(self, n: int):
+        return sp.eye(n, dtype=bool, format=self.name)
+
+    def convert(self, m):
+        if isinstance(m, BitMatrix):
+            m = m.tocsr()
+        if isinstance(m, np.ndarray):
+            m = sp.csr_matrix(m)
+        if m.format == self.name and m.dtype == bool:
+            return m
+        return m.asformat(self.name).astype(bool)
+
+    def matmul(self, a, b):
+        if self._dense_product(a, b):
+            product = four_russians_matmul(
+                BitMatrix.from_sparse(a), BitMatrix.from_sparse(b)
+            )
+            return self.convert(product)
+        return a @ b
+
+    def _dense_product(self, a, b) -> bool:
+        if self.dense_product_density is None:
+            return False
+        if max(*a.shape, b.shape[1]) > BITS_MAX_SIZE or min(*a.shape, b.shape[1]) < 64:
+            return False
+        return all(
+            m.nnz >= self.dense_product_density * m.shape[0] * m.shape[1]
+            for m in (a, b)
+        )
+
+    def union(self, a, b):
+        return a + b
+
+    def difference(self, a, b):
+        return a > b
+
+    def kron(self, a, b):
+        return sp.kron(a, b, self.name)
+
+    def rows(self, m, idx):
+        return m[idx]
+
+    def cols(self, m, idx):
+        return m[:, idx]
+
+    def nnz(self, m) -> int:
+        return m.nnz
+
+    def nonzero(self, m) -> tuple[np.ndarray, np.ndarray]:
+        return m.nonzero()
+
+
+class DenseBackend:
+    """
+    Boolean matrices as dense NumPy arrays. Products go through float32
+    BLAS, which is exact while a row meets a column in fewer than 2**24
+    places.
+    """
+
+    name = "dense"
+
+    def matrix(self, rows, cols, shape: tuple[int, int]):
+        m = np.zeros(shape, dtype=bool)
+        m[np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)] = True
+        return m
+
+    def zeros(self, shape: tuple[int, int]):
+        return np.zeros(shape, dtype=bool)
+
+    def eye(self, n: int):
+        return np.eye(n, dtype=bool)
+
+    def convert(self, m):
+        if sp.issparse(m) or isinstance(m, BitMatrix):
+            return m.toarray().astype(bool, copy=False)
+        return np.asarray(m, dtype=bool)
+
+    def matmul(self, a, b):
+        return (a.astype(np.float32) @ b.astype(np.float32)) > 0
+
+    def union(self, a, b):
+        return a | b
+
+    def difference(self, a, b):
+        return a & ~b
+
+    def kron(self, a, b):
+        return np.kron(a, b)
+
+    def rows(self, m, idx):
+        return m[idx]
+
+    def cols(self, m, idx):
+        return m[:, idx]
+
+    def nnz(self, m) -> int:
+        return int(np.count_nonzero(m))
+
+    def nonzero(self, m) -> tuple[np.ndarray, np.ndarray]:
+        return m.nonzero()
+
+
+class BitBackend:
+    """
+    Boolean matrices as BitMatrix, rows packed into uint64 words: 64 times
+    less memory than dense arrays and word-wide OR in every product step.
+    """
+
+    name = "bits"
+
+    def matrix(self, rows, cols, shape: tuple[int, int]):
+        return BitMatrix.from_coo(rows, cols, shape)
+
+    def zeros(self, shape: tuple[int, int]):
+        return BitMatrix.zeros(shape)
+
+    def eye(self, n: int):
+        return BitMatrix.eye(n)
+
+    def convert(self, m):
+        if isinstance(m, BitMatrix):
+            return m
+        if sp.issparse(m):
+            return BitMatrix.from_sparse(m)
+        return BitMatrix.from_dense(m)
+
+    def matmul(self, a, b):
+        return a @ b
+
+    def union(self, a, b):
+        return a | b
+
+    def difference(self, a, b):
+        return a > b
+
+    def kron(self, a, b):
+        return a.kron(b)
+
+    def rows(self, m, idx):
+        return m[idx]
+
+    def cols(self, m, idx):
+        return m[:, idx]
+
+    def nnz(self, m) -> int:
+        return m.nnz
+
+    def nonzero(self, m) -> tuple[np.ndarray, np.ndarray]:
+        return m.nonzero()
+
+
+BACKENDS = {
+    "csr": SparseBackend("csr"),
+    "csc": SparseBackend("csc"),
+    "lil": SparseBackend("lil"),
+    "dense": DenseBackend(),
+    "bits": BitBackend(),
+}
+
+# automatic choice: dense representations pay off once a matrix is dense
+# enough that sparse indexing dominates; byte arrays use BLAS products up
+# to DENSE_MAX_SIZE, packed bits keep n * n / 8 bytes affordable beyond it
+DENSE_MAX_SIZE = 4096
+BITS_MAX_SIZE = 16384
+DENSE_MIN_DENSITY = 0.05
+
+
+def choose_backend(n: int, nnz: int):
+    if 0 < n and nnz >= DENSE_MIN_DENSITY * n * n:
+        if n <= DENSE_MAX_SIZE:
+            return BACKENDS["dense"]
+        if n <= BITS_MAX_SIZE:
+            return BACKENDS["bits"]
+    return BACKENDS["csr"]
+
+
+def get_backend(backend=None, n: Optional[int] = None, nnz: Optional[int] = None):
+    if backend is None:
+        return choose_backend(n or 0, nnz or 0)
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"unknown matrix backend {backend!r}, expected one of {list(BACKENDS)}"
+            )
+        return BACKENDS[backend]
+    return backend
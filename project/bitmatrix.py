@@ -0,0 +1,219 @@
+from typing import Iterable
+
+import numpy as np
+import scipy.sparse as sp
+
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> int:
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(_BYTE_POPCOUNT[words.view(np.uint8)].sum(dtype=np.int64))
+
+
+def pack_rows(dense: np.ndarray) -> np.ndarray:
+    rows, cols = dense.shape
+    n_words = -(-cols // 64)
+    packed = np.zeros((rows, n_words * 8), dtype=np.uint8)
+    packed[:, : -(-cols // 8)] = np.packbits(dense, axis=1, bitorder="little")
+    return packed.view(np.uint64)
+
+
+class BitMatrix:
+    """
+    Boolean matrix whose rows are packed into uint64 words, bit j of a row
+    living in word j // 64. Padding bits past the last column stay zero.
+    Supports the operators of boolean scipy matrices over the OR-AND
+    semiring: @, + (or |), > (difference) and &.
+    """
+
+    def __init__(self, words: np.ndarray, shape: tuple[int, int]):
+        self.words = words
+        self.shape = shape
+
+    @classmethod
+    def zeros(cls, shape: tuple[int, int]) -> "BitMatrix":
+        return cls(np.zeros((shape[0], -(-shape[1] // 64)), dtype=np.uint64), shape)
+
+    @classmethod
+    def from_coo(
+        cls, rows: Iterable[int], cols: Iterable[int], shape: tuple[int, int]
+    ) -> "BitMatrix":
+        m = cls.zeros(shape)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        bits = np.left_shift(np.uint64(1), (cols & 63).astype(np.uint64))
+        np.bitwise_or.at(m.words, (rows, cols >> 6), bits)
+        return m
+
+    @classmethod
+    def from_dense(cls, dense: np.ndarray) -> "BitMatrix":
+        dense = np.asarray(dense, dtype=bool)
+        return cls(pack_rows(dense), dense.shape)
+
+    @classmethod
+    def from_sparse(cls, m: sp.spmatrix) -> "BitMatrix":
+        # scattering single bits is slower than packing a dense copy once
+        # the matrix has more than a few nonzeros per word
+        if m.nnz * 16 > m.shape[0] * m.shape[1]:
+            return cls.from_dense(m.toarray())
+        m = m.tocoo()
+        return cls.from_coo(m.row[m.data != 0], m.col[m.data != 0], m.shape)
+
+    @classmethod
+    def eye(cls, n: int) -> "BitMatrix":
+        return cls.from_coo(np.arange(n), np.arange(n), (n, n))
+
+    def toarray(self) -> np.ndarray:
+        bits = np.unpackbits(self.words.view(np.uint8), axis=1, bitorder="little")
+        return bits[:, : self.shape[1]].astype(bool)
+
+    def tocsr(self) -> sp.csr_matrix:
+        # nonzero() is row-major, so the CSR arrays need no sorting
+        rows, cols = self.nonzero()
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.shape[0]), out=indptr[1:])
+        return sp.csr_matrix(
+            (np.ones(len(cols), dtype=bool), cols, indptr), shape=self.shape
+        )
+
+    @property
+    def nnz(self) -> int:
+        return popcount(self.words)
+
+    def nonzero(self) -> tuple[np.ndarray, np.ndarray]:
+        # only rows with a set word are unpacked
+        rows = np.flatnonzero(self.words.any(axis=1))
+        bits = np.unpackbits(
+            self.words[rows].view(np.uint8), axis=1, bitorder="little"
+        )[:, : self.shape[1]]
+        i, j = bits.nonzero()
+        return rows[i], j
+
+    def _check(self, other: "BitMatrix"):
+        if self.shape != other.shape:
+            raise ValueError(f"shape mismatch: {self.shape} and {other.shape}")
+
+    def __or__(self, other: "BitMatrix") -> "BitMatrix":
+        self._check(other)
+        return BitMatrix(self.words | other.words, self.shape)
+
+    __add__ = __or__
+
+    def __radd__(self, other) -> "BitMatrix":
+        # lets sum() start from 0 like it does for scipy matrices
+        if isinstance(other, int) and other == 0:
+            return self
+        return NotImplemented
+
+    def __and__(self, other: "BitMatrix") -> "BitMatrix":
+        self._check(other)
+        return BitMatrix(self.words & other.words, self.shape)
+
+    def __gt__(self, other: "BitMatrix") -> "BitMatrix":
+        self._check(other)
+        return BitMatrix(self.words & ~other.words, self.shape)
+
+    def density(self) -> float:
+        size = self.shape[0] * self.shape[1]
+        return self.nnz / size if size else 0.0
+
+    def __matmul__(self, other: "BitMatrix") -> "BitMatrix":
+        if self.shape[1] != other.shape[0]:
+            raise ValueError(f"shape mismatch: {self.shape} @ {other.shape}")
+        if (
+            self.shape[0] >= FOUR_RUSSIANS_MIN_ROWS
+            and self.density() >= FOUR_RUSSIANS_MIN_DENSITY
+        ):
+            return four_russians_matmul(self, other)
+        # row i of the product is the OR of the rows of other selected by
+        # the set bits of row i of self, which come out of nonzero() grouped
+        # by row
+        result = BitMatrix.zeros((self.shape[0], other.shape[1]))
+        rows, cols = self.nonzero()
+        if len(rows) != 0:
+            first = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            result.words[rows[first]] = np.bitwise_or.reduceat(
+                other.words[cols], first, axis=0
+            )
+        return result
+
+    def __getitem__(self, key) -> "BitMatrix":
+        if isinstance(key, tuple):
+            rows, cols = key
+            if not (isinstance(rows, slice) and rows == slice(None)):
+                return self[rows][:, cols]
+            cols = np.asarray(cols, dtype=np.int64)
+            bits = (
+                (self.words[:, cols >> 6] >> (cols & 63).astype(np.uint64))
+                & np.uint64(1)
+            ) != 0
+            return BitMatrix.from_dense(bits)
+        words = self.words[key]
+        return BitMatrix(words, (words.shape[0], self.shape[1]))
+
+    def kron(self, other: "BitMatrix") -> "BitMatrix":
+        # the product is as sparse as its factors, so it is assembled from
+        # the coordinates of their set bits
+        ai, ak = self.nonzero()
+        bj, bl = other.nonzero()
+        rows = (ai[:, None] * other.shape[0] + bj[None, :]).ravel()
+        cols = (ak[:, None] * other.shape[1] + bl[None, :]).ravel()
+        return BitMatrix.from_coo(
+            rows,
+            cols,
+            (self.shape[0] * other.shape[0], self.shape[1] * other.shape[1]),
+        )
+
+    @property
+    def T(self) -> "BitMatrix":
+        rows, cols = self.nonzero()
+        return BitMatrix.from_coo(cols, rows, (self.shape[1], self.shape[0]))
+
+    def __repr__(self) -> str:
+        return f"<BitMatrix {self.shape[0]}x{self.shape[1]} with {self.nnz} set bits>"
+
+
+# left operands with enough rows to amortize the tables and at least this
+# dense are multiplied by four_russians_matmul, sparser ones row by row
+FOUR_RUSSIANS_MIN_ROWS = 256
+FOUR_RUSSIANS_MIN_DENSITY = 0.005
+
+
+def four_russians_matmul(a: BitMatrix, b: BitMatrix, block: int = 8) -> BitMatrix:
+    # method of Four Russians: the rows of b are taken in blocks of `block`,
+    # the ORs of all 2**block subsets of a block are tabulated once, and
+    # every row of a then ORs in a single table row per block, picked by
+    # the `block` bits of a that select the rows of b
+    if a.shape[1] != b.shape[0]:
+        raise ValueError(f"shape mismatch: {a.shape} @ {b.shape}")
+    if not 1 <= block <= 16:
+        raise ValueError(f"block must be between 1 and 16, got {block}")
+
+    result = BitMatrix.zeros((a.shape[0], b.shape[1]))
+    table = np.zeros((1 << block, b.words.shape[1]), dtype=np.uint64)
+    mask = np.uint64((1 << block) - 1)
+
+    for k0 in range(0, a.shape[1], block):
+        width = min(block, a.shape[1] - k0)
+        rows = b.words[k0 : k0 + width]
+        if not rows.any():
+            continue
+        for bit in range(width):
+            table[1 << bit : 2 << bit] = table[: 1 << bit] | rows[bit]
+
+        # a block may straddle two words of a
+        word, shift = k0 >> 6, k0 & 63
+        keys = a.words[:, word] >> np.uint64(shift)
+        if shift + width > 64:
+            keys |= a.words[:, word + 1] << np.uint64(64 - shift)
+        keys = (keys & mask).astype(np.intp)
+        if width < block:
+            keys &= (1 << width) - 1
+
+        selected = np.flatnonzero(keys)
+        if len(selected) != 0:
+            result.words[selected] |= table[keys[selected]]
+
+    return result
@@ -0,0 +1,32 @@
+from typing import Iterable
+
+import numpy as np
+
+from project.backend import get_backend
+
+
+def transitive_closure(m, backend="csr"):
+    # every squaring doubles the covered path length, so this takes
+    # at most log2(n) + 1 rounds and stops as soon as nothing changes
+    backend = get_backend(backend)
+    m = backend.convert(m)
+    while True:
+        nnz = backend.nnz(m)
+        m = backend.union(m, backend.matmul(m, m))
+        if backend.nnz(m) == nnz:
+            return m
+
+
+def reachable_from(m, starts: Iterable[int], backend="csr"):
+    # row i holds the states reachable from starts[i] by a non-empty path
+    backend = get_backend(backend)
+    m = backend.convert(m)
+    starts = list(starts)
+    k, n = len(starts), m.shape[0]
+
+    front = backend.matrix(np.arange(k), starts, (k, n))
+    visited = backend.zeros((k, n))
+    while backend.nnz(front) != 0:
+        front = backend.difference(backend.matmul(front, m), visited)
+        visited = backend.union(visited, front)
+    return visited
@@ -0,0 +1,210 @@
+from typing import Any, Hashable, Iterable, Iterator, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def label_matrices(
+    sources: np.ndarray,
+    targets: np.ndarray,
+    label_codes: np.ndarray,
+    labels: list,
+    n: int,
+) -> dict[Any, csr_matrix]:
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    label_codes = np.asarray(label_codes, dtype=np.int64)
+
+    order = np.argsort(label_codes, kind="stable")
+    bounds = np.searchsorted(label_codes[order], np.arange(len(labels) + 1))
+
+    matrices = {}
+    for code, label in enumerate(labels):
+        edges = order[bounds[code] : bounds[code + 1]]
+        matrices[label] = csr_matrix(
+            (np.ones(len(edges), dtype=bool), (sources[edges], targets[edges])),
+            shape=(n, n),
+            dtype=bool,
+        )
+    return matrices
+
+
+class LabeledGraph:
+    """
+    Compact edge-labeled graph: nodes are interned into dense indices
+    and every label owns a boolean CSR adjacency matrix over them.
+    version is bumped on every mutation so that caches built from the
+    graph can tell when they are stale.
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[Hashable],
+        sources: np.ndarray,
+        targets: np.ndarray,
+        label_codes: np.ndarray,
+        labels: Iterable[Any],
+    ):
+        self.nodes = list(nodes)
+        self.node_to_idx = {node: i for i, node in enumerate(self.nodes)}
+        self.labels = list(labels)
+
+        self.sources = np.asarray(sources, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.label_codes = np.asarray(label_codes, dtype=np.int64)
+
+        self.adjacency = label_matrices(
+            self.sources,
+            self.targets,
+            self.label_codes,
+            self.labels,
+            len(self.nodes),
+        )
+        self.version = 0
+
+    @classmethod
+    def from_edges(
+        cls,
+        edges: Iterable[Tuple[Hashable, Any, Hashable]],
+        nodes: Optional[Iterable[Hashable]] = None,
+        count: int = -1,
+    ) -> "LabeledGraph":
+        nodes = [] if nodes is None else list(nodes)
+        node_to_idx = {node: i for i, node in enumerate(nodes)}
+        label_to_code = {}
+
+        def intern(node):
+            idx = node_to_idx.get(node)
+            if idx is None:
+                idx = node_to_idx[node] = len(nodes)
+                nodes.append(node)
+            return idx
+
+        # the edge walk itself is Python work, but the indices are written
+        # straight into one flat int64 buffer without per-edge containers
+        flat = np.fromiter(
+            (
+                idx
+                for u, l, v in edges
+                for idx in (
+                    intern(u),
+                    intern(v),
+                    label_to_code.setdefault(l, len(label_to_code)),
+                )
+            ),
+            dtype=np.int64,
+            count=-1 if count < 0 else 3 * count,
+        ).reshape(-1, 3)
+
+        return cls(nodes, flat[:, 0], flat[:, 1], flat[:, 2], label_to_code.keys())
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph) -> "LabeledGraph":
+        return cls.from_edges(
+            ((u, l, v) for u, v, l in graph.edges(data="label")),
+            nodes=graph.nodes,
+            count=graph.number_of_edges(),
+        )
+
+    def add_edges(self, edges: Iterable[Tuple[Hashable, Any, Hashable]]):
+        n = len(self.nodes)
+        label_to_code = {label: code for code, label in enumerate(self.labels)}
+
+        def intern(node):
+            idx = self.node_to_idx.get(node)
+            if idx is None:
+                idx = self.node_to_idx[node] = len(self.nodes)
+                self.nodes.append(node)
+            return idx
+
+        def code(label):
+            if label not in label_to_code:
+                label_to_code[label] = len(self.labels)
+                self.labels.append(label)
+            return label_to_code[label]
+
+        new = np.array(
+            [(intern(u), intern(v), code(l)) for u, l, v in edges], dtype=np.int64
+        ).reshape(-1, 3)
+        if len(new) == 0:
+            return
+
+        self.sources = np.concatenate([self.sources, new[:, 0]])
+        self.targets = np.concatenate([self.targets, new[:, 1]])
+        self.label_codes = np.concatenate([self.label_codes, new[:, 2]])
+
+        m = len(self.nodes)
+        if m != n:
+            self.adjacency = label_matrices(
+                self.sources, self.targets, self.label_codes, self.labels, m
+            )
+        else:
+            # same node set: only the touched labels gain entries
+            added = label_matrices(new[:, 0], new[:, 1], new[:, 2], self.labels, m)
+            for code in np.unique(new[:, 2]).tolist():
+                label = self.labels[code]
+                old = self.adjacency.get(label)
+                self.adjacency[label] = (
+                    added[label] if old is None else old + added[label]
+                )
+        self.version += 1
+
+    def remove_edges(self, edges: Iterable[Tuple[Hashable, Any, Hashable]]):
+        # like MultiDiGraph.remove_edge, every triple removes one parallel
+        # copy; triples that are not in the graph are ignored
+        label_to_code = {label: code for code, label in enumerate(self.labels)}
+        n, k = len(self.nodes), len(self.labels)
+        keys = (self.sources * n + self.targets) * k + self.label_codes
+
+        wanted = {}
+        for u, l, v in edges:
+            if u in self.node_to_idx and v in self.node_to_idx and l in label_to_code:
+                key = (self.node_to_idx[u] * n + self.node_to_idx[v]) * k
+                key += label_to_code[l]
+                wanted[key] = wanted.get(key, 0) + 1
+
+        drop = []
+        candidates = np.flatnonzero(np.isin(keys, list(wanted)))
+        for i in candidates.tolist():
+            if wanted[keys[i]] > 0:
+                wanted[keys[i]] -= 1
+                drop.append(i)
+        if not drop:
+            return
+
+        keep = np.ones(len(keys), dtype=bool)
+        keep[drop] = False
+        self.sources = self.sources[keep]
+        self.targets = self.targets[keep]
+        self.label_codes = self.label_codes[keep]
+        self.adjacency = label_matrices(
+            self.sources, self.targets, self.label_codes, self.labels, n
+        )
+        self.version += 1
+
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    def number_of_edges(self) -> int:
+        return len(self.label_codes)
+
+    def label_histogram(self) -> dict[Any, int]:
+        counts = np.bincount(self.label_codes, minlength=len(self.labels))
+        return dict(zip(self.labels, counts.tolist()))
+
+    def indices(self, nodes: Iterable[Hashable]) -> np.ndarray:
+        return np.fromiter(
+            (self.node_to_idx[node] for node in nodes if node in self.node_to_idx),
+            dtype=np.int64,
+        )
+
+    def triples(self) -> Iterator[Tuple[Hashable, Any, Hashable]]:
+        for s, e, code in zip(self.sources, self.targets, self.label_codes):
+            yield self.nodes[s], self.labels[code], self.nodes[e]
+
+
+def as_labeled_graph(graph: nx.DiGraph | LabeledGraph) -> LabeledGraph:
+    if isinstance(graph, LabeledGraph):
+        return graph
+    return LabeledGraph.from_networkx(graph)
@@ -0,0 +1,69 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Hashable
+
+from project.task3 import FiniteAutomaton
+from project.task4 import reachability_with_constraints
+
+# set once per worker process by _init_worker
+_fa = None
+_constraints_fa = None
+_lazy = False
+_backend = None
+
+
+def _init_worker(fa_path: str, constraints_path: str, lazy: bool, backend):
+    global _fa, _constraints_fa, _lazy, _backend
+    # the graph matrices are memory-mapped read-only, so all workers share
+    # one copy through the page cache and tasks carry only start indices
+    _fa = FiniteAutomaton.load(fa_path)
+    _constraints_fa = FiniteAutomaton.load(constraints_path)
+    _lazy = lazy
+    _backend = backend
+
+
+def _reach_chunk(starts: list[int]) -> dict[Hashable, set[Hashable]]:
+    _fa.start_states = set(starts)
+    result = reachability_with_constraints(
+        _fa, _constraints_fa, lazy=_lazy, backend=_backend
+    )
+    return {_fa.states_list[s].value: result[_fa.states_list[s].value] for s in starts}
+
+
+def chunked(items: list, chunks: int) -> list[list]:
+    size = -(-len(items) // chunks)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def parallel_reachability_with_constraints(
+    fa: FiniteAutomaton,
+    constraints_fa: FiniteAutomaton,
+    processes: int = None,
+    lazy: bool = False,
+    backend=None,
+) -> dict[Hashable, set[Hashable]]:
+    processes = os.cpu_count() if processes is None else processes
+    result = {s.value: set() for s in fa.states_list}
+    starts = sorted(fa.starts())
+    if len(starts) == 0:
+        return result
+
+    # a few chunks per process even out uneven per-source costs
+    chunks = chunked(starts, min(len(starts), 4 * processes))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fa_path = os.path.join(tmp, "graph.fa")
+        constraints_path = os.path.join(tmp, "constraints.fa")
+        fa.save(fa_path)
+        constraints_fa.save(constraints_path)
+
+        with ProcessPoolExecutor(
+            max_workers=min(processes, len(chunks)),
+            initializer=_init_worker,
+            initargs=(fa_path, constraints_path, lazy, backend),
+        ) as pool:
+            for part in pool.map(_reach_chunk, chunks):
+                result.update(part)
+
+    return result
@@ -1,28 +1,115 @@
 from pyformlang.regular_expression import *
 from pyformlang.finite_automaton import *
 from networkx import MultiDiGraph
-from typing import Set
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Set
+import os
+import pickle
 
+if TYPE_CHECKING:
+    from project.graph import LabeledGraph
 
+
+class RegexCache:
+    """
+    Bounded LRU cache of minimized DFAs keyed by normalized regex text,
+    optionally persisted to a pickle file that is loaded on creation and
+    rewritten after every miss.
+    """
+
+    def __init__(self, maxsize: int = 512, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._dfas = OrderedDict()
+
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                self._dfas.update(pickle.load(f))
+            self._evict()
+
+    @staticmethod
+    def normalize(regex: str) -> str:
+        return " ".join(regex.split())
+
+    def get(self, regex: str) -> DeterministicFiniteAutomaton:
+        key = self.normalize(regex)
+        if key in self._dfas:
+            self.hits += 1
+            self._dfas.move_to_end(key)
+            return self._dfas[key]
+
+        self.misses += 1
+        dfa = Regex(key).to_epsilon_nfa().minimize()
+        self._dfas[key] = dfa
+        self._evict()
+        if self.path is not None:
+            self.save()
+        return dfa
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(dict(self._dfas), f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self._dfas.clear()
+        self.hits = self.misses = 0
+
+    def info(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._dfas),
+            "maxsize": self.maxsize,
+        }
+
+    def _evict(self):
+        while len(self._dfas) > self.maxsize:
+            self._dfas.popitem(last=False)
+
+
+_regex_cache = RegexCache()
+
+
+def configure_regex_cache(maxsize: int = 512, path: Optional[str] = None) -> RegexCache:
+    global _regex_cache
+    _regex_cache = RegexCache(maxsize, path)
+    return _regex_cache
+
+
+def regex_cache_info() -> dict[str, int]:
+    return _regex_cache.info()
+
+
+# the returned DFA is shared between callers and must not be modified
 def regex_to_dfa(regex: str) -> DeterministicFiniteAutomaton:
-    return Regex(regex).to_epsilon_nfa().minimize()
+    return _regex_cache.get(regex)
 
 
 def graph_to_nfa(
-    graph: MultiDiGraph, start_states: Set[int], final_states: Set[int]
+    graph: "MultiDiGraph | LabeledGraph", start_states: Set[int], final_states: Set[int]
 ) -> NondeterministicFiniteAutomaton:
     nfa = NondeterministicFiniteAutomaton()
 
     if not start_states:
-        start_states = set(graph.nodes())
+        start_states = set(graph.nodes)
     if not final_states:
-        final_states = set(graph.nodes())
+        final_states = set(graph.nodes)
 
     for state in start_states:
         nfa.add_start_state(State(state))
     for state in final_states:
         nfa.add_final_state(State(state))
-    for s, e, label in graph.edges(data="label"):
-        nfa.add_transition(s, label, e)
+    # scipy is only needed once a LabeledGraph is involved
+    from project.graph import LabeledGraph
+
+    if isinstance(graph, LabeledGraph):
+        nfa.add_transitions(graph.triples())
+    else:
+        for s, e, label in graph.edges(data="label"):
+            nfa.add_transition(s, label, e)
 
     return nfa
@@ -7,9 +7,16 @@ from pyformlang.finite_automaton import (
     NondeterministicFiniteAutomaton,
     State,
 )
-from scipy.sparse import dok_matrix, kron
+import copy
+import numpy as np
+import pickle
+from scipy.sparse import csr_matrix
+from typing import Iterable, Iterator
 
-from project.task2 import regex_to_dfa, graph_to_nfa
+from project.backend import get_backend
+from project.closure import reachable_from
+from project.graph import LabeledGraph, as_labeled_graph, label_matrices
+from project.task2 import regex_to_dfa
 
 
 class FiniteAutomaton:
@@ -23,24 +30,145 @@ class FiniteAutomaton:
         if finite_automaton is None:
             return
 
-        state_to_i = {s: i for i, s in enumerate(finite_automaton.states)}
-
         self.states_list = list(finite_automaton.states)
+        state_to_i = {s: i for i, s in enumerate(self.states_list)}
 
         self.start_states = {state_to_i[st] for st in finite_automaton.start_states}
         self.final_states = {state_to_i[fi] for fi in finite_automaton.final_states}
 
-        self.matrix = {}
-
-        states = finite_automaton.to_dict()
-        n = len(finite_automaton.states)
-
-        for l in finite_automaton.symbols:
-            self.matrix[l] = dok_matrix((n, n), dtype=bool)
-            for st, ls in states.items():
-                if l in ls:
-                    for fi in ls[l] if isinstance(ls[l], set) else {ls[l]}:
-                        self.matrix[l][state_to_i[st], state_to_i[fi]] = True
+        symbols = list(finite_automaton.symbols)
+        symbol_to_code = {symbol: i for i, symbol in enumerate(symbols)}
+
+        rows, cols, codes = [], [], []
+        for st, ls in finite_automaton.to_dict().items():
+            for l, fis in ls.items():
+                for fi in fis if isinstance(fis, set) else {fis}:
+                    rows.append(state_to_i[st])
+                    cols.append(state_to_i[fi])
+                    codes.append(symbol_to_code[l])
+
+        self.matrix = label_matrices(rows, cols, codes, symbols, len(self.states_list))
+
+    @classmethod
+    def from_graph(
+        cls,
+        graph: MultiDiGraph | LabeledGraph,
+        start_states: set[int] = None,
+        final_states: set[int] = None,
+    ) -> "FiniteAutomaton":
+        graph = as_labeled_graph(graph)
+        fa = cls()
+
+        start_states = start_states or graph.nodes
+        final_states = final_states or graph.nodes
+
+        # like graph_to_nfa, start and final nodes missing from the graph
+        # become isolated states
+        nodes = list(graph.nodes)
+        node_to_idx = dict(graph.node_to_idx)
+        for node in [*start_states, *final_states]:
+            if node not in node_to_idx:
+                node_to_idx[node] = len(nodes)
+                nodes.append(node)
+
+        n, extra = len(nodes), len(nodes) - graph.number_of_nodes()
+        fa.states_list = [State(node) for node in nodes]
+        fa.start_states = {node_to_idx[node] for node in start_states}
+        fa.final_states = {node_to_idx[node] for node in final_states}
+        fa.matrix = {
+            l: (
+                m
+                if extra == 0
+                else csr_matrix(
+                    (
+                        m.data,
+                        m.indices,
+                        np.append(m.indptr, np.full(extra, m.indptr[-1])),
+                    ),
+                    shape=(n, n),
+                )
+            )
+            for l, m in graph.adjacency.items()
+        }
+
+        return fa
+
+    # file layout: magic, header length, pickled header, then the CSR
+    # arrays of every label, each aligned to _ALIGN bytes
+    _MAGIC = b"FAMATRIX"
+    _ALIGN = 64
+
+    def save(self, path: str):
+        arrays = []
+        layout = {}
+        offset = 0
+        for l, m in self.matrix.items():
+            m = get_backend("csr").convert(m)
+            entry = {}
+            for name in ("indptr", "indices", "data"):
+                arr = np.ascontiguousarray(getattr(m, name))
+                offset += -offset % self._ALIGN
+                entry[name] = (offset, arr.dtype.str, arr.shape[0])
+                arrays.append((offset, arr))
+                offset += arr.nbytes
+            layout[l] = (entry, m.shape)
+
+        header = pickle.dumps(
+            {
+                "states": [state.value for state in self.states_list],
+                "start_states": sorted(self.start_states),
+                "final_states": sorted(self.final_states),
+                "layout": layout,
+            }
+        )
+        base = len(self._MAGIC) + 8 + len(header)
+        base += -base % self._ALIGN
+
+        with open(path, "wb") as f:
+            f.write(self._MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for arr_offset, arr in arrays:
+                f.seek(base + arr_offset)
+                f.write(arr.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "FiniteAutomaton":
+        with open(path, "rb") as f:
+            if f.read(len(cls._MAGIC)) != cls._MAGIC:
+                raise ValueError(f"{path} is not a saved FiniteAutomaton")
+            header = pickle.loads(f.read(int.from_bytes(f.read(8), "little")))
+            base = f.tell()
+        base += -base % cls._ALIGN
+
+        fa = cls()
+        fa.states_list = [State(value) for value in header["states"]]
+        fa.start_states = set(header["start_states"])
+        fa.final_states = set(header["final_states"])
+        fa.matrix = {}
+        for l, (entry, shape) in header["layout"].items():
+            # the arrays stay backed by the read-only mapping, so processes
+            # loading the same file share it through the page cache
+            indptr, indices, data = (
+                (
+                    np.memmap(
+                        path, dtype=dtype, mode="r", offset=base + offset, shape=size
+                    )
+                    if size != 0
+                    else np.empty(0, dtype=dtype)
+                )
+                for offset, dtype, size in (
+                    entry[name] for name in ("indptr", "indices", "data")
+                )
+            )
+            fa.matrix[l] = csr_matrix((data, indices, indptr), shape=shape, copy=False)
+        return fa
+
+    def to_backend(self, backend) -> "FiniteAutomaton":
+        fa = copy.copy(self)
+        backend = get_backend(backend)
+        fa.matrix = {l: backend.convert(m) for l, m in self.matrix.items()}
+        return fa
 
     def accepts(self, word) -> bool:
         nfa = matrix_to_nfa(self)
@@ -49,13 +177,10 @@ class FiniteAutomaton:
     def is_empty(self) -> bool:
         if len(self.matrix) == 0:
             return True
-        m = sum(self.matrix.values())
-        for _ in range(m.shape[0]):
-            m += m @ m
-        for st, fi in product(self.start_states, self.final_states):
-            if m[st, fi] != 0:
-                return False
-        return True
+        starts = list(self.start_states)
+        reachable = reachable_from(sum(self.matrix.values()), starts)
+        _, fis = reachable.nonzero()
+        return self.final_states.isdisjoint(fis.tolist())
 
     def size(self):
         return len(self.states_list)
@@ -74,13 +199,7 @@ def matrix_to_nfa(automaton: FiniteAutomaton) -> NondeterministicFiniteAutomaton
     nfa = NondeterministicFiniteAutomaton()
 
     for l, m in automaton.matrix.items():
-        nfa.add_transitions(
-            [
-                (st, l, fi)
-                for (st, fi) in product(range(m.shape[0]), repeat=2)
-                if automaton.matrix[l][st, fi]
-            ]
-        )
+        nfa.add_transitions([(int(st), l, int(fi)) for st, fi in zip(*m.nonzero())])
 
     for s in automaton.start_states:
         nfa.add_start_state(s)
@@ -91,15 +210,18 @@ def matrix_to_nfa(automaton: FiniteAutomaton) -> NondeterministicFiniteAutomaton
 
 
 def intersect_automata(
-    automaton1: FiniteAutomaton, automaton2: FiniteAutomaton
+    automaton1: FiniteAutomaton, automaton2: FiniteAutomaton, backend="csr"
 ) -> FiniteAutomaton:
 
+    backend = get_backend(backend)
     ls = automaton1.matrix.keys() & automaton2.matrix.keys()
     fa = FiniteAutomaton()
     fa.matrix = {}
 
     for l in ls:
-        fa.matrix[l] = kron(automaton1.matrix[l], automaton2.matrix[l], "csr")
+        fa.matrix[l] = backend.kron(
+            backend.convert(automaton1.matrix[l]), backend.convert(automaton2.matrix[l])
+        )
 
     fa.start_states = set()
     fa.final_states = set()
@@ -114,14 +236,142 @@ def intersect_automata(
     return fa
 
 
+class LazyIntersection:
+    """
+    Product of two automata whose transitions are generated on demand
+    from the CSR rows of both operands instead of a materialized kron.
+    """
+
+    def __init__(self, automaton1: FiniteAutomaton, automaton2: FiniteAutomaton):
+        ls = automaton1.matrix.keys() & automaton2.matrix.keys()
+        csr = get_backend("csr")
+        matrix1 = {l: csr.convert(automaton1.matrix[l]) for l in ls}
+        matrix2 = {l: csr.convert(automaton2.matrix[l]) for l in ls}
+
+        # automaton2 is usually the small query side, so its outgoing
+        # transitions are grouped per state once
+        self.out2 = [[] for _ in range(automaton2.size())]
+        for l, m in matrix2.items():
+            for j in range(m.shape[0]):
+                targets = m.indices[m.indptr[j] : m.indptr[j + 1]]
+                if len(targets) != 0:
+                    self.out2[j].append((matrix1[l], targets.tolist()))
+
+        self.start_states = set(
+            product(automaton1.start_states, automaton2.start_states)
+        )
+        self.final_states1 = automaton1.final_states
+        self.final_states2 = automaton2.final_states
+
+    def is_final(self, state: tuple[int, int]) -> bool:
+        return state[0] in self.final_states1 and state[1] in self.final_states2
+
+    def successors(self, state: tuple[int, int]) -> Iterator[tuple[int, int]]:
+        i, j = state
+        for m1, targets2 in self.out2[j]:
+            for i2 in m1.indices[m1.indptr[i] : m1.indptr[i + 1]].tolist():
+                for j2 in targets2:
+                    yield i2, j2
+
+    def reachable(self, state: tuple[int, int]) -> set[tuple[int, int]]:
+        visited = set()
+        to_visit = [state]
+        while to_visit:
+            for next_state in self.successors(to_visit.pop()):
+                if next_state not in visited:
+                    visited.add(next_state)
+                    to_visit.append(next_state)
+        return visited
+
+    def reachable_finals(
+        self, roots: Iterable[tuple[int, int]]
+    ) -> dict[tuple[int, int], set[int]]:
+        # one lazy Tarjan pass over the part of the product reachable from
+        # all roots: every strongly connected component is explored once and
+        # keeps the automaton1 part of the final states reachable from it by
+        # a non-empty path, so overlapping searches share their work
+        roots = list(roots)
+        index, low, comp = {}, {}, {}
+        comp_finals = []
+        stack, on_stack = [], set()
+
+        def enter(v):
+            index[v] = low[v] = len(index)
+            stack.append(v)
+            on_stack.add(v)
+            work.append((v, self.successors(v)))
+
+        for root in roots:
+            if root in index:
+                continue
+            work = []
+            enter(root)
+            while work:
+                v, successors = work[-1]
+                for w in successors:
+                    if w not in index:
+                        enter(w)
+                        break
+                    if w in on_stack:
+                        low[v] = min(low[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        u = work[-1][0]
+                        low[u] = min(low[u], low[v])
+                    if low[v] != index[v]:
+                        continue
+
+                    cid = len(comp_finals)
+                    members = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        comp[w] = cid
+                        members.append(w)
+                        if w == v:
+                            break
+
+                    finals = set()
+                    for x in members:
+                        for w in self.successors(x):
+                            if self.is_final(w):
+                                finals.add(w[0])
+                            if comp[w] != cid:
+                                finals |= comp_finals[comp[w]]
+                    comp_finals.append(finals)
+
+        return {root: comp_finals[comp[root]] for root in roots}
+
+
 def paths_ends(
-    graph: MultiDiGraph, start_nodes: set[int], final_nodes: set[int], regex: str
+    graph: MultiDiGraph | LabeledGraph,
+    start_nodes: set[int],
+    final_nodes: set[int],
+    regex: str | DeterministicFiniteAutomaton,
+    lazy: bool = False,
+    processes: int = 1,
+    backend=None,
 ) -> list[tuple[int, int]]:
-    fa1 = FiniteAutomaton(graph_to_nfa(graph, start_nodes, final_nodes))
-    fa2 = FiniteAutomaton(regex_to_dfa(regex))
+    fa1 = FiniteAutomaton.from_graph(graph, start_nodes, final_nodes)
+    fa2 = FiniteAutomaton(regex_to_dfa(regex) if isinstance(regex, str) else regex)
+
+    if processes != 1:
+        from project.parallel import parallel_reachability_with_constraints
+
+        reached = parallel_reachability_with_constraints(
+            fa1, fa2, processes, lazy, backend
+        )
+        return [(s, f) for s, finals in reached.items() for f in finals]
+
+    # lazy mode never materializes the product and explores only the part
+    # reachable from the start nodes, which pays off for small start sets
+    if lazy:
+        return _lazy_paths_ends(fa1, fa2)
+
     fa = intersect_automata(fa1, fa2)
 
-    n_states2 = fa2.matrix.values().__iter__().__next__().shape[0]
+    n_states2 = len(fa2.states_list)
 
     def extract_fa1_node_idx(i):
         return fa1.states_list[i // n_states2].value
@@ -135,11 +385,27 @@ def paths_ends(
         return res
 
     m = sum(fa.matrix.values())
-    for _ in range(m.shape[0]):
-        m += m @ m
+    backend = get_backend(backend, m.shape[0], m.nnz)
+    starts = list(fa.start_states)
+    reachable = reachable_from(m, starts, backend)
+    for i, fi in zip(*backend.nonzero(reachable)):
+        if fi in fa.final_states:
+            res.add((extract_fa1_node_idx(starts[i]), extract_fa1_node_idx(fi)))
+
+    return list(res)
+
 
-    for st, fi in product(fa.start_states, fa.final_states):
-        if m[st, fi] != 0:
-            res.add((extract_fa1_node_idx(st), extract_fa1_node_idx(fi)))
+def _lazy_paths_ends(
+    fa1: FiniteAutomaton, fa2: FiniteAutomaton
+) -> list[tuple[int, int]]:
+    fa = LazyIntersection(fa1, fa2)
+
+    res = set()
+    for st, finals in fa.reachable_finals(fa.start_states).items():
+        n = fa1.states_list[st[0]].value
+        if fa.is_final(st):
+            res.add((n, n))
+        for fi in finals:
+            res.add((n, fa1.states_list[fi].value))
 
     return list(res)
@@ -1,55 +1,208 @@
-from scipy.sparse import dok_matrix, block_diag
+from typing import Iterable
 
+import numpy as np
+from networkx import MultiDiGraph
+
+from project.backend import get_backend
+from project.graph import LabeledGraph, as_labeled_graph
+from project.task2 import regex_to_dfa
 from project.task3 import (
     FiniteAutomaton,
+    LazyIntersection,
 )
 
 
 def reachability_with_constraints(
-    fa: FiniteAutomaton, constraints_fa: FiniteAutomaton
+    fa: FiniteAutomaton,
+    constraints_fa: FiniteAutomaton,
+    lazy: bool = False,
+    processes: int = 1,
+    backend=None,
 ) -> dict[int, set[int]]:
 
-    m, n = constraints_fa.size(), fa.size()
+    # start states are independent, so they can be split over a process pool
+    if processes != 1:
+        from project.parallel import parallel_reachability_with_constraints
 
-    def get_front(s):
-        front = dok_matrix((m, m + n), dtype=bool)
-        for i in constraints_fa.starts():
-            front[i, i] = True
-        for i in range(m):
-            front[i, s + m] = True
-        return front
-
-    def diagonalized(mat):
-        result = dok_matrix(mat.shape, dtype=bool)
-        for i in range(mat.shape[0]):
-            for j in range(mat.shape[0]):
-                if mat[j, i]:
-                    result[i] += mat[j]
-        return result
+        return parallel_reachability_with_constraints(
+            fa, constraints_fa, processes, lazy, backend
+        )
+
+    # see paths_ends: lazy mode is meant for small start sets on large graphs
+    if lazy:
+        return _lazy_reachability_with_constraints(fa, constraints_fa)
+
+    m, n = constraints_fa.size(), fa.size()
+    starts = list(fa.starts())
+    k = len(starts)
 
     labels = fa.labels() & constraints_fa.labels()
     result = {s.value: set() for s in fa.states_list}
-    adj = {
-        label: block_diag((constraints_fa.matrix[label], fa.matrix[label]))
+    if k == 0:
+        return result
+
+    # rows b * m .. b * m + m - 1 hold the fa states reached from starts[b],
+    # one row for each state of constraints_fa
+    backend = get_backend(backend, n, sum(fa.matrix[label].nnz for label in labels))
+    rows = [b * m + i for b in range(k) for i in constraints_fa.starts()]
+    cols = [s for s in starts for _ in constraints_fa.starts()]
+    front = backend.matrix(rows, cols, (k * m, n))
+    visited = front
+
+    # moving rows along a constraint transition i -> j inside every block
+    # is a sparse row permutation by kron(I_k, C^T)
+    adj = [
+        (
+            backend.kron(
+                backend.eye(k), backend.convert(constraints_fa.matrix[label].T)
+            ),
+            backend.convert(fa.matrix[label]),
+        )
         for label in labels
-    }
-
-    for state in fa.starts():
-        front = get_front(state)
-        if state in fa.final_states:
-            for i in constraints_fa.start_states:
-                if i in constraints_fa.final_states:
-                    result[fa.states_list[state]].add(fa.states_list[state])
-
-        for _ in range(m * n):
-            new_front = dok_matrix((m, m + n), dtype=bool)
-            for l in labels:
-                new_front += diagonalized(front @ adj[l])
-            front = new_front
-            for i in range(m):
-                if i in constraints_fa.final_states and front[i, i]:
-                    for j in range(n):
-                        if j in fa.final_states and front[i, j + m]:
-                            result[fa.states_list[state]].add(fa.states_list[j])
+    ]
+
+    while backend.nnz(front) != 0:
+        new_front = backend.zeros((k * m, n))
+        for permutation, fa_mat in adj:
+            new_front = backend.union(
+                new_front, backend.matmul(permutation, backend.matmul(front, fa_mat))
+            )
+        front = backend.difference(new_front, visited)
+        visited = backend.union(visited, front)
+
+    for row, j in zip(*backend.nonzero(visited)):
+        b, i = divmod(row, m)
+        if i in constraints_fa.final_states and j in fa.final_states:
+            result[fa.states_list[starts[b]].value].add(fa.states_list[j].value)
 
     return result
+
+
+def _lazy_reachability_with_constraints(
+    fa: FiniteAutomaton, constraints_fa: FiniteAutomaton
+) -> dict[int, set[int]]:
+    product = LazyIntersection(fa, constraints_fa)
+    result = {s.value: set() for s in fa.states_list}
+
+    for st, finals in product.reachable_finals(product.start_states).items():
+        reached = result[fa.states_list[st[0]].value]
+        if product.is_final(st):
+            reached.add(fa.states_list[st[0]].value)
+        reached |= {fa.states_list[fi].value for fi in finals}
+
+    return result
+
+
+class RpqView:
+    """
+    Materialized answers of one regular query on one graph. The view keeps
+    the visited matrix of the multiple-source BFS above, one block of DFA
+    state rows per start node, and on edge insertion resumes the BFS only
+    from the product states the new edges make reachable.
+    """
+
+    def __init__(
+        self,
+        graph: MultiDiGraph | LabeledGraph,
+        regex: str,
+        start_nodes: set = None,
+        backend="csr",
+    ):
+        self.graph = as_labeled_graph(graph)
+        self.dfa = FiniteAutomaton(regex_to_dfa(regex))
+        self.start_nodes = None if start_nodes is None else set(start_nodes)
+        self.backend = get_backend(backend)
+        self.rebuild()
+
+    def _current_starts(self) -> list[int]:
+        if self.start_nodes is None:
+            return list(range(self.graph.number_of_nodes()))
+        return sorted(int(i) for i in self.graph.indices(self.start_nodes))
+
+    def rebuild(self):
+        self.starts = []
+        self.visited = self.backend.zeros((0, self.graph.number_of_nodes()))
+        self._expand(self._add_starts(self._current_starts()))
+        self.version = self.graph.version
+
+    def _add_starts(self, starts: list[int]):
+        # new blocks of rows whose front holds (start, dfa start state)
+        backend, d = self.backend, self.dfa.size()
+        n = self.graph.number_of_nodes()
+        k, new_k = len(self.starts), len(self.starts) + len(starts)
+        rows, cols = backend.nonzero(self.visited)
+        self.visited = backend.matrix(rows, cols, (new_k * d, n))
+        self.starts += starts
+
+        rows = [(k + b) * d + q for b in range(len(starts)) for q in self.dfa.starts()]
+        cols = [s for s in starts for _ in self.dfa.starts()]
+        self._steps = [
+            (
+                backend.kron(backend.eye(new_k), backend.convert(m.T)),
+                backend.convert(self.graph.adjacency[label]),
+            )
+            for label, m in self.dfa.matrix.items()
+            if label in self.graph.adjacency
+        ]
+        return backend.matrix(rows, cols, (new_k * d, n))
+
+    def _expand(self, front):
+        backend = self.backend
+        front = backend.difference(front, self.visited)
+        self.visited = backend.union(self.visited, front)
+        while backend.nnz(front) != 0:
+            new_front = backend.zeros(self.visited.shape)
+            for permutation, graph_mat in self._steps:
+                new_front = backend.union(
+                    new_front,
+                    backend.matmul(permutation, backend.matmul(front, graph_mat)),
+                )
+            front = backend.difference(new_front, self.visited)
+            self.visited = backend.union(self.visited, front)
+
+    def add_edges(self, edges: Iterable[tuple]):
+        if self.version != self.graph.version:
+            self.rebuild()
+        edges = list(edges)
+        backend, d = self.backend, self.dfa.size()
+        self.graph.add_edges(edges)
+        n = self.graph.number_of_nodes()
+
+        rows, cols = backend.nonzero(self.visited)
+        self.visited = backend.matrix(rows, cols, (self.visited.shape[0], n))
+        known = set(self.starts)
+        front = self._add_starts([s for s in self._current_starts() if s not in known])
+
+        # a new edge u -l-> v extends every reached (u, q) with q -l-> q2
+        # to (v, q2) in the same block; the BFS continues from there only
+        out = {}
+        for label, m in self.dfa.matrix.items():
+            for q, q2 in zip(*m.nonzero()):
+                out.setdefault((label, int(q)), []).append(int(q2))
+        idx = self.graph.node_to_idx
+        seed_rows, seed_cols = [], []
+        for u, l, v in edges:
+            reached, _ = backend.nonzero(backend.cols(self.visited, [idx[u]]))
+            for row in reached.tolist():
+                b, q = divmod(row, d)
+                for q2 in out.get((l, q), ()):
+                    seed_rows.append(b * d + q2)
+                    seed_cols.append(idx[v])
+
+        seed = backend.matrix(seed_rows, seed_cols, self.visited.shape)
+        self._expand(backend.union(front, seed))
+        self.version = self.graph.version
+
+    def query(self, start_nodes: set = None, final_nodes: set = None) -> set:
+        if self.version != self.graph.version:
+            self.rebuild()
+        d, nodes = self.dfa.size(), self.graph.nodes
+        rows, cols = self.backend.nonzero(self.visited)
+        blocks, states = np.divmod(rows, d)
+        final = np.isin(states, list(self.dfa.final_states))
+        return {
+            (nodes[self.starts[b]], nodes[v])
+            for b, v in zip(blocks[final].tolist(), cols[final].tolist())
+            if (start_nodes is None or nodes[self.starts[b]] in start_nodes)
+            and (final_nodes is None or nodes[v] in final_nodes)
+        }
@@ -0,0 +1,192 @@
+import math
+import time
+from typing import Hashable, Iterable, Optional
+
+import numpy as np
+from networkx import MultiDiGraph
+from pyformlang.finite_automaton import DeterministicFiniteAutomaton
+from scipy.optimize import nnls
+
+from project.closure import transitive_closure
+from project.graph import LabeledGraph, as_labeled_graph
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton, intersect_automata
+from project.task4 import reachability_with_constraints
+
+STRATEGIES = ("all_pairs", "multiple_source")
+
+
+class RpqCostModel:
+    """
+    Linear cost model of the two regular query strategies: all pairs by the
+    transitive closure of the product automaton, filtered to the start
+    nodes, and the multiple-source BFS of reachability_with_constraints.
+    """
+
+    def __init__(self, weights: Optional[dict[str, list[float]]] = None):
+        # defaults from one calibrate_rpq run, refit them on the local machine
+        self.weights = weights or {
+            "all_pairs": [3e-2, 0.0, 2e-4, 0.0],
+            "multiple_source": [2e-2, 0.0, 5e-8],
+        }
+
+    @staticmethod
+    def features(
+        graph: LabeledGraph, dfa_fa: FiniteAutomaton, n_starts: int
+    ) -> dict[str, list[float]]:
+        n, d = graph.number_of_nodes(), dfa_fa.size()
+        # edges of the product automaton: only labels used by the regex count,
+        # which is where label selectivity comes in
+        product_edges = sum(
+            graph.adjacency[l].nnz * m.nnz
+            for l, m in dfa_fa.matrix.items()
+            if l in graph.adjacency
+        )
+        product_states = n * d
+        return {
+            "all_pairs": [
+                1.0,
+                product_states,
+                product_edges,
+                product_edges * math.log2(product_states + 1),
+            ],
+            "multiple_source": [1.0, n_starts * d, n_starts * product_edges],
+        }
+
+    def estimate(
+        self, graph: LabeledGraph, dfa_fa: FiniteAutomaton, n_starts: int
+    ) -> dict[str, float]:
+        features = self.features(graph, dfa_fa, n_starts)
+        return {
+            strategy: float(np.dot(self.weights[strategy], features[strategy]))
+            for strategy in STRATEGIES
+        }
+
+    def choose(
+        self, graph: LabeledGraph, dfa_fa: FiniteAutomaton, n_starts: int
+    ) -> str:
+        costs = self.estimate(graph, dfa_fa, n_starts)
+        return min(STRATEGIES, key=costs.__getitem__)
+
+
+_cost_model = RpqCostModel()
+
+
+def configure_rpq_cost_model(model: RpqCostModel) -> RpqCostModel:
+    global _cost_model
+    _cost_model = model
+    return _cost_model
+
+
+def _all_pairs(
+    graph: LabeledGraph, dfa_fa: FiniteAutomaton, starts, finals
+) -> set[tuple[Hashable, Hashable]]:
+    starts = set(starts or graph.nodes)
+    fa1 = FiniteAutomaton.from_graph(graph, starts | set(graph.nodes), finals)
+    fa = intersect_automata(fa1, dfa_fa)
+    d = dfa_fa.size()
+
+    def node(i):
+        return fa1.states_list[i // d].value
+
+    res = {
+        (node(st), node(st))
+        for st in fa.start_states & fa.final_states
+        if node(st) in starts
+    }
+    if len(fa.matrix) == 0:
+        return res
+
+    closure = transitive_closure(sum(fa.matrix.values()))
+    rows = sorted(st for st in fa.start_states if node(st) in starts)
+    for i, fi in zip(*closure[rows].nonzero()):
+        if fi in fa.final_states:
+            res.add((node(rows[i]), node(fi)))
+    return res
+
+
+def _multiple_source(
+    graph: LabeledGraph, dfa_fa: FiniteAutomaton, starts, finals
+) -> set[tuple[Hashable, Hashable]]:
+    fa = FiniteAutomaton.from_graph(graph, starts, finals)
+    reached = reachability_with_constraints(fa, dfa_fa)
+    return {(s, f) for s, ends in reached.items() for f in ends}
+
+
+_strategies = {"all_pairs": _all_pairs, "multiple_source": _multiple_source}
+
+
+def _regex_fa(regex: str | DeterministicFiniteAutomaton) -> FiniteAutomaton:
+    return FiniteAutomaton(regex_to_dfa(regex) if isinstance(regex, str) else regex)
+
+
+def estimate_rpq(
+    graph: MultiDiGraph | LabeledGraph,
+    regex: str | DeterministicFiniteAutomaton,
+    n_starts: int,
+) -> dict[str, float]:
+    return _cost_model.estimate(as_labeled_graph(graph), _regex_fa(regex), n_starts)
+
+
+def rpq(
+    graph: MultiDiGraph | LabeledGraph,
+    regex: str | DeterministicFiniteAutomaton,
+    starts: Optional[set[Hashable]] = None,
+    finals: Optional[set[Hashable]] = None,
+    strategy: Optional[str] = None,
+) -> set[tuple[Hashable, Hashable]]:
+    graph = as_labeled_graph(graph)
+    dfa_fa = _regex_fa(regex)
+
+    if strategy is None:
+        n_starts = len(starts) if starts else graph.number_of_nodes()
+        strategy = _cost_model.choose(graph, dfa_fa, n_starts)
+    return _strategies[strategy](graph, dfa_fa, starts, finals)
+
+
+def calibrate_rpq(
+    sizes: Iterable[int] = (100, 300, 1000),
+    regexes: Iterable[str] = ("a*", "a b*", "(a | b)* c", "a (b | c)* a"),
+    start_fractions: Iterable[float] = (0.01, 0.1, 0.5, 1.0),
+    seed: int = 0,
+    install: bool = True,
+) -> RpqCostModel:
+    # times both strategies on random graphs and fits non-negative weights
+    # per strategy by least squares
+    rng = np.random.default_rng(seed)
+    samples = {strategy: ([], []) for strategy in STRATEGIES}
+
+    for n in sizes:
+        edges = 3 * n
+        graph = LabeledGraph(
+            range(n),
+            rng.integers(0, n, edges),
+            rng.integers(0, n, edges),
+            rng.choice(3, edges, p=[0.6, 0.3, 0.1]),
+            ["a", "b", "c"],
+        )
+        for regex in regexes:
+            dfa_fa = FiniteAutomaton(regex_to_dfa(regex))
+            for fraction in start_fractions:
+                k = max(1, int(fraction * n))
+                starts = set(rng.choice(n, k, replace=False).tolist())
+                features = RpqCostModel.features(graph, dfa_fa, k)
+                for strategy in STRATEGIES:
+                    begin = time.perf_counter()
+                    _strategies[strategy](graph, dfa_fa, starts, None)
+                    samples[strategy][0].append(features[strategy])
+                    samples[strategy][1].append(time.perf_counter() - begin)
+
+    weights = {}
+    for strategy, (xs, ys) in samples.items():
+        xs, ys = np.array(xs, dtype=float), np.array(ys)
+        # columns differ by orders of magnitude, so fit in scaled units
+        scale = xs.max(axis=0)
+        scale[scale == 0] = 1
+        w, _ = nnls(xs / scale, ys)
+        weights[strategy] = (w / scale).tolist()
+
+    model = RpqCostModel(weights)
+    if install:
+        configure_rpq_cost_model(model)
+    return model
@@ -1,9 +1,12 @@
 import networkx as nx
 import pyformlang
-from typing import Tuple
+from itertools import islice
+from typing import Iterator, Optional, Tuple
 
 from pyformlang.cfg import CFG, Variable, Terminal, Epsilon
 
+from project.graph import LabeledGraph, as_labeled_graph
+
 
 def cfg_to_weak_normal_form(cfg: pyformlang.cfg.CFG) -> pyformlang.cfg.CFG:
     clear_cfg = cfg.eliminate_unit_productions().remove_useless_symbols()
@@ -15,11 +18,31 @@ def cfg_to_weak_normal_form(cfg: pyformlang.cfg.CFG) -> pyformlang.cfg.CFG:
 
 def cfpq_with_hellings(
     cfg: pyformlang.cfg.CFG,
-    graph: nx.DiGraph,
+    graph: nx.DiGraph | LabeledGraph,
     start_nodes: set[int] = None,
     final_nodes: set[int] = None,
 ) -> set[Tuple[int, int]]:
+    return set(iter_cfpq_with_hellings(cfg, graph, start_nodes, final_nodes))
+
+
+def iter_cfpq_with_hellings(
+    cfg: pyformlang.cfg.CFG,
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: set[int] = None,
+    final_nodes: set[int] = None,
+    limit: Optional[int] = None,
+) -> Iterator[Tuple[int, int]]:
+    return islice(_hellings_pairs(cfg, graph, start_nodes, final_nodes), limit)
+
+
+def _hellings_pairs(
+    cfg: pyformlang.cfg.CFG,
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: set[int] = None,
+    final_nodes: set[int] = None,
+) -> Iterator[Tuple[int, int]]:
 
+    graph = as_labeled_graph(graph)
     if start_nodes is None:
         start_nodes = set(graph.nodes)
     if final_nodes is None:
@@ -39,45 +62,62 @@ def cfpq_with_hellings(
         elif len(p.body) == 2:
             cfg_threes.setdefault(p.head, set()).add((p.body[0], p.body[1]))
 
-    result = {(n_ith, vert, vert) for n_ith in cfg_twos for vert in graph.nodes}
+    n = graph.number_of_nodes()
+    result = {(n_ith, vert, vert) for n_ith in cfg_twos for vert in range(n)}
 
     # Add terminal productions based on graph edges
-    add_to_result = set()
-    for v, u, tag in graph.edges.data("label"):
+    for tag, m in graph.adjacency.items():
+        vs, us = m.nonzero()
         for n_ith in cfg_ones:
             if Terminal(tag) in cfg_ones[n_ith]:
-                add_to_result.add((n_ith, v, u))
-    result |= add_to_result
+                result |= {(n_ith, int(v), int(u)) for v, u in zip(vs, us)}
 
-    immediate = result.copy()
+    # reverse production index: (left, right) -> heads
+    body_to_heads = {}
+    for n_kth, bodies in cfg_threes.items():
+        for body in bodies:
+            body_to_heads.setdefault(body, set()).add(n_kth)
+
+    # derived facts indexed by their first and by their last vertex
+    outgoing = {}
+    incoming = {}
+    for n_ith, v, u in result:
+        outgoing.setdefault(v, set()).add((n_ith, u))
+        incoming.setdefault(u, set()).add((n_ith, v))
+
+    nodes = graph.nodes
+
+    # facts are never retracted, so a start-symbol fact is an answer as
+    # soon as it is derived
+    def answer(n_ith, v, u):
+        return (
+            n_ith == cfg.start_symbol
+            and nodes[v] in start_nodes
+            and nodes[u] in final_nodes
+        )
 
-    while immediate:
-        n_ith, vi, ui = immediate.pop()
-        add_to = set()
-        for n_jth, vj, uj in result:
-            if ui == vj:
-                for n_kth in cfg_threes:
-                    if (n_ith, n_jth) in cfg_threes[n_kth] and (
-                        n_kth,
-                        vi,
-                        uj,
-                    ) not in result:
-                        immediate.add((n_kth, vi, uj))
-                        add_to.add((n_kth, vi, uj))
-            if vi == uj:
-                for n_kth in cfg_threes:
-                    if (n_jth, n_ith) in cfg_threes[n_kth] and (
-                        n_kth,
-                        vj,
-                        ui,
-                    ) not in result:
-                        immediate.add((n_kth, vj, ui))
-                        add_to.add((n_kth, vj, ui))
-        result |= add_to
-
-    final_result = set()
     for n_ith, v, u in result:
-        if v in start_nodes and u in final_nodes and n_ith == cfg.start_symbol:
-            final_result.add((v, u))
+        if answer(n_ith, v, u):
+            yield nodes[v], nodes[u]
+
+    immediate = list(result)
+
+    def add_fact(n_kth, v, u):
+        if (n_kth, v, u) not in result:
+            result.add((n_kth, v, u))
+            outgoing.setdefault(v, set()).add((n_kth, u))
+            incoming.setdefault(u, set()).add((n_kth, v))
+            immediate.append((n_kth, v, u))
+            return True
+        return False
 
-    return final_result
+    while immediate:
+        n_ith, vi, ui = immediate.pop()
+        for n_jth, uj in list(outgoing.get(ui, ())):
+            for n_kth in body_to_heads.get((n_ith, n_jth), ()):
+                if add_fact(n_kth, vi, uj) and answer(n_kth, vi, uj):
+                    yield nodes[vi], nodes[uj]
+        for n_jth, vj in list(incoming.get(vi, ())):
+            for n_kth in body_to_heads.get((n_jth, n_ith), ()):
+                if add_fact(n_kth, vj, ui) and answer(n_kth, vj, ui):
+                    yield nodes[vj], nodes[ui]
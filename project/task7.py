@@ -1,65 +1,304 @@
 import pyformlang
 from pyformlang.cfg import Terminal
-from scipy.sparse import dok_matrix
+from itertools import islice
+import numpy as np
 
 import networkx as nx
 from typing import *
 
-import copy
-
+from project.backend import get_backend
+from project.graph import LabeledGraph, as_labeled_graph
 from project.task6 import cfg_to_weak_normal_form
 
 
 def cfpq_with_matrix(
     cfg: pyformlang.cfg.CFG,
-    graph: nx.DiGraph,
+    graph: nx.DiGraph | LabeledGraph,
     start_nodes: Set[int] = None,
     final_nodes: Set[int] = None,
+    backend=None,
 ) -> set[tuple[int, int]]:
+    return set(
+        iter_cfpq_with_matrix(cfg, graph, start_nodes, final_nodes, backend=backend)
+    )
+
+
+def iter_cfpq_with_matrix(
+    cfg: pyformlang.cfg.CFG,
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: Set[int] = None,
+    final_nodes: Set[int] = None,
+    limit: Optional[int] = None,
+    backend=None,
+) -> Iterator[tuple[int, int]]:
+    return islice(_matrix_pairs(cfg, graph, start_nodes, final_nodes, backend), limit)
+
+
+def _matrix_pairs(
+    cfg: pyformlang.cfg.CFG,
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: Set[int] = None,
+    final_nodes: Set[int] = None,
+    backend=None,
+) -> Iterator[tuple[int, int]]:
+
+    graph = as_labeled_graph(graph)
+    start_nodes = set(graph.nodes) if start_nodes is None else start_nodes
+    final_nodes = set(graph.nodes) if final_nodes is None else final_nodes
+    grammar = _Grammar(cfg)
+
+    n = graph.number_of_nodes()
+    backend = get_backend(backend, n, graph.number_of_edges())
+    M = grammar.base_facts(graph, backend)
+
+    S = grammar.start
+    nodes = graph.nodes
+
+    # every round's delta of S holds pairs not reported before
+    def pairs(m):
+        ns, ms = backend.nonzero(m)
+        for n, m in zip(ns, ms):
+            if nodes[n] in start_nodes and nodes[m] in final_nodes:
+                yield nodes[n], nodes[m]
+
+    if S not in M:
+        return
+    yield from pairs(M[S])
+
+    for delta in grammar.semi_naive(M, dict(M), backend):
+        yield from pairs(delta[S])
+
+
+class _Grammar:
+    # productions of a weak normal form grammar grouped the way the matrix
+    # engine and the incremental index consume them
+
+    def __init__(self, cfg: pyformlang.cfg.CFG):
+        cfg = cfg_to_weak_normal_form(cfg)
+        self.start = cfg.start_symbol.to_text()
+        self.heads = {p.head.to_text() for p in cfg.productions}
+
+        self.t_to_Ts = {}
+        for p in cfg.productions:
+            if len(p.body) == 1 and isinstance(p.body[0], Terminal):
+                self.t_to_Ts.setdefault(p.body[0].to_text(), set()).add(
+                    p.head.to_text()
+                )
+
+        self.N_to_eps = {p.head.to_text() for p in cfg.productions if len(p.body) == 0}
+
+        self.N_to_NN = {}
+        for p in cfg.productions:
+            if len(p.body) == 2:
+                self.N_to_NN.setdefault(p.head.to_text(), set()).add(
+                    (p.body[0].to_text(), p.body[1].to_text())
+                )
 
-    start_nodes = graph.nodes if start_nodes is None else start_nodes
-    final_nodes = graph.nodes if final_nodes is None else final_nodes
-    cfg = cfg_to_weak_normal_form(cfg)
-
-    M = {
-        p.head.to_text(): dok_matrix(
-            (graph.number_of_nodes(), graph.number_of_nodes()), dtype=bool
-        )
-        for p in cfg.productions
-    }
-
-    t_to_Ts = {}
-    for p in cfg.productions:
-        if len(p.body) == 1 and isinstance(p.body[0], Terminal):
-            t_to_Ts.setdefault(p.body[0].to_text(), set()).add(p.head.to_text())
-
-    for b, e, t in graph.edges(data="label"):
-        if t in t_to_Ts:
-            for T in t_to_Ts[t]:
-                M[T][b, e] = True
-
-    N_to_eps = {p.head.to_text() for p in cfg.productions if len(p.body) == 0}
-    for N in N_to_eps:
-        M[N].setdiag(True)
-
-    M_new = copy.deepcopy(M)
-    for m in M_new.values():
-        m.clear()
-
-    N_to_NN = {}
-    for p in cfg.productions:
-        if len(p.body) == 2:
-            N_to_NN.setdefault(p.head.to_text(), set()).add(
-                (p.body[0].to_text(), p.body[1].to_text())
+    def base_facts(self, graph: LabeledGraph, backend) -> dict:
+        # facts given directly by terminal edges and epsilon productions
+        n = graph.number_of_nodes()
+        facts = {N: ([], []) for N in self.heads}
+        for t, Ts in self.t_to_Ts.items():
+            if t not in graph.adjacency:
+                continue
+            bs, es = graph.adjacency[t].nonzero()
+            for T in Ts:
+                facts[T][0].append(bs)
+                facts[T][1].append(es)
+
+        for N in self.N_to_eps:
+            facts[N][0].append(np.arange(n))
+            facts[N][1].append(np.arange(n))
+
+        return {
+            N: backend.matrix(
+                np.concatenate(rows) if rows else [],
+                np.concatenate(cols) if cols else [],
+                (n, n),
             )
+            for N, (rows, cols) in facts.items()
+        }
 
-    for i in range(graph.number_of_nodes() ** 2):
-        for N, NN in N_to_NN.items():
+    def products(self, left: dict, right: dict, backend) -> dict:
+        # for every head N, the union of left[Nl] @ right[Nr] over N -> Nl Nr
+        shape = next(iter(left.values())).shape
+        result = {N: backend.zeros(shape) for N in self.heads}
+        for N, NN in self.N_to_NN.items():
             for Nl, Nr in NN:
-                M_new[N] += M[Nl] @ M[Nr]
-        for N, m in M_new.items():
-            M[N] += m
+                result[N] = backend.union(
+                    result[N], backend.matmul(left[Nl], right[Nr])
+                )
+        return result
+
+    def semi_naive(self, M: dict, delta: dict, backend) -> Iterator[dict]:
+        # semi-naive evaluation: every round multiplies only the facts added
+        # by the previous one and stops once no matrix gains a nonzero;
+        # M must already contain delta, is updated in place and every
+        # round's delta is yielded
+        while any(backend.nnz(d) != 0 for d in delta.values()):
+            left = self.products(delta, M, backend)
+            right = self.products(M, delta, backend)
+            delta = {
+                N: backend.difference(backend.union(left[N], right[N]), M[N]) for N in M
+            }
+            for N in M:
+                M[N] = backend.union(M[N], delta[N])
+            yield delta
+
+
+def _intersection(backend, a, b):
+    return backend.difference(a, backend.difference(a, b))
+
+
+class MatrixCfpqIndex:
+    """
+    Materialized nonterminal matrices of the matrix CFPQ engine for one
+    grammar and graph, kept up to date under edge updates. Insertions run
+    the semi-naive loop from the new facts only. Deletions follow DRed:
+    every fact with a derivation through a deleted one is removed, the
+    removed facts that still have a derivation are put back, and the loop
+    propagates from those.
+    """
+
+    def __init__(
+        self,
+        cfg: pyformlang.cfg.CFG,
+        graph: nx.DiGraph | LabeledGraph,
+        backend="csr",
+    ):
+        self.grammar = _Grammar(cfg)
+        self.graph = as_labeled_graph(graph)
+        self.backend = get_backend(backend)
+        self.rebuild()
+
+    def rebuild(self):
+        self.M = self.grammar.base_facts(self.graph, self.backend)
+        for _ in self.grammar.semi_naive(self.M, dict(self.M), self.backend):
+            pass
+        self.version = self.graph.version
+
+    def _sync(self):
+        # the graph was changed behind the index's back
+        if self.version != self.graph.version:
+            self.rebuild()
+
+    def _resize(self, n: int):
+        backend = self.backend
+        for N, m in self.M.items():
+            if m.shape[0] != n:
+                rows, cols = backend.nonzero(m)
+                self.M[N] = backend.matrix(rows, cols, (n, n))
+
+    def _edge_facts(self, edges: list, n: int) -> dict:
+        rows = {N: [] for N in self.grammar.heads}
+        cols = {N: [] for N in self.grammar.heads}
+        idx = self.graph.node_to_idx
+        for u, l, v in edges:
+            for T in self.grammar.t_to_Ts.get(l, ()):
+                rows[T].append(idx[u])
+                cols[T].append(idx[v])
+        return {N: self.backend.matrix(rows[N], cols[N], (n, n)) for N in rows}
+
+    def add_edges(self, edges: Iterable[tuple]):
+        self._sync()
+        edges = list(edges)
+        backend = self.backend
+        old_n = self.graph.number_of_nodes()
+        self.graph.add_edges(edges)
+        n = self.graph.number_of_nodes()
+        self._resize(n)
+
+        delta = self._edge_facts(edges, n)
+        for N in self.grammar.N_to_eps:
+            new_nodes = np.arange(old_n, n)
+            eps = backend.matrix(new_nodes, new_nodes, (n, n))
+            delta[N] = backend.union(delta[N], eps)
+
+        delta = {N: backend.difference(delta[N], self.M[N]) for N in self.M}
+        for N in self.M:
+            self.M[N] = backend.union(self.M[N], delta[N])
+        for _ in self.grammar.semi_naive(self.M, delta, backend):
+            pass
+        self.version = self.graph.version
+
+    def remove_edges(self, edges: Iterable[tuple]):
+        self._sync()
+        edges = [(u, l, v) for u, l, v in edges]
+        backend, grammar = self.backend, self.grammar
+        self.graph.remove_edges(edges)
+        if self.version == self.graph.version:
+            return
+        n = self.graph.number_of_nodes()
+        M = self.M
+
+        # base facts of edges that are gone from the adjacency matrices;
+        # a removed parallel copy leaves its label entry in place
+        gone = [
+            (u, l, v)
+            for u, l, v in edges
+            if u in self.graph.node_to_idx
+            and v in self.graph.node_to_idx
+            and not self._has_edge(u, l, v)
+        ]
+        seed = self._edge_facts(gone, n)
+        seed = {N: _intersection(backend, seed[N], M[N]) for N in M}
+
+        # over-delete everything derived with at least one deleted fact
+        deleted, delta = dict(seed), seed
+        while any(backend.nnz(d) != 0 for d in delta.values()):
+            left = grammar.products(delta, M, backend)
+            right = grammar.products(M, delta, backend)
+            delta = {
+                N: backend.difference(
+                    _intersection(backend, backend.union(left[N], right[N]), M[N]),
+                    deleted[N],
+                )
+                for N in M
+            }
+            deleted = {N: backend.union(deleted[N], delta[N]) for N in M}
+
+        for N in M:
+            M[N] = backend.difference(M[N], deleted[N])
+
+        # rederive the deleted facts that still have a derivation, looking
+        # only at the rows where something was deleted
+        base = grammar.base_facts(self.graph, backend)
+        rederived = {N: _intersection(backend, base[N], deleted[N]) for N in M}
+        for N, NN in grammar.N_to_NN.items():
+            rows, _ = backend.nonzero(deleted[N])
+            if len(rows) == 0:
+                continue
+            rows = np.unique(rows)
+            select = backend.matrix(rows, rows, (n, n))
+            for Nl, Nr in NN:
+                candidates = backend.matmul(backend.matmul(select, M[Nl]), M[Nr])
+                rederived[N] = backend.union(
+                    rederived[N], _intersection(backend, candidates, deleted[N])
+                )
+
+        for N in M:
+            M[N] = backend.union(M[N], rederived[N])
+        for _ in grammar.semi_naive(M, rederived, backend):
+            pass
+        self.version = self.graph.version
+
+    def _has_edge(self, u, l, v) -> bool:
+        m = self.graph.adjacency.get(l)
+        idx = self.graph.node_to_idx
+        return m is not None and bool(m[idx[u], idx[v]])
 
-    S = cfg.start_symbol.to_text()
-    ns, ms = M[S].nonzero()
-    return {(n, m) for n, m in zip(ns, ms) if n in start_nodes and m in final_nodes}
+    def query(
+        self, start_nodes: Set[int] = None, final_nodes: Set[int] = None
+    ) -> set[tuple[int, int]]:
+        self._sync()
+        nodes = self.graph.nodes
+        start_nodes = set(nodes) if start_nodes is None else start_nodes
+        final_nodes = set(nodes) if final_nodes is None else final_nodes
+        if self.grammar.start not in self.M:
+            return set()
+        ns, ms = self.backend.nonzero(self.M[self.grammar.start])
+        return {
+            (nodes[i], nodes[j])
+            for i, j in zip(ns, ms)
+            if nodes[i] in start_nodes and nodes[j] in final_nodes
+        }
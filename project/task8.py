@@ -1,22 +1,54 @@
-from itertools import product
-from typing import Set, Tuple, Union
+from itertools import islice
+from typing import Iterator, Optional, Set, Tuple, Union
 
 import networkx as nx
 from pyformlang.cfg import CFG, Epsilon
 from pyformlang.finite_automaton import EpsilonNFA, Symbol, State, TransitionFunction
 from pyformlang.regular_expression import Regex
 from pyformlang.rsa import RecursiveAutomaton, Box
-from scipy.sparse import dok_matrix, kron, eye
+import numpy as np
 
-from project.task2 import graph_to_nfa
+from project.backend import get_backend
+from project.closure import transitive_closure
+from project.graph import LabeledGraph, as_labeled_graph
 
 
 def cfpq_with_tensor(
     cfg_or_rsm: Union[CFG, RecursiveAutomaton],
-    graph: nx.DiGraph,
+    graph: nx.DiGraph | LabeledGraph,
     start_nodes: Set[int] = None,
     final_nodes: Set[int] = None,
+    backend=None,
 ) -> Set[Tuple[int, int]]:
+    return set(
+        iter_cfpq_with_tensor(
+            cfg_or_rsm, graph, start_nodes, final_nodes, backend=backend
+        )
+    )
+
+
+def iter_cfpq_with_tensor(
+    cfg_or_rsm: Union[CFG, RecursiveAutomaton],
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: Set[int] = None,
+    final_nodes: Set[int] = None,
+    limit: Optional[int] = None,
+    backend=None,
+) -> Iterator[Tuple[int, int]]:
+    return islice(
+        _tensor_pairs(cfg_or_rsm, graph, start_nodes, final_nodes, backend), limit
+    )
+
+
+def _tensor_pairs(
+    cfg_or_rsm: Union[CFG, RecursiveAutomaton],
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: Set[int] = None,
+    final_nodes: Set[int] = None,
+    backend=None,
+) -> Iterator[Tuple[int, int]]:
+
+    graph = as_labeled_graph(graph)
 
     rsm = (
         cfg_or_rsm
@@ -24,8 +56,8 @@ def cfpq_with_tensor(
         else cfg_to_rsm(cfg_or_rsm)
     )
 
-    start_nodes = graph.nodes if start_nodes is None else start_nodes
-    final_nodes = graph.nodes if final_nodes is None else final_nodes
+    start_nodes = set(graph.nodes) if start_nodes is None else start_nodes
+    final_nodes = set(graph.nodes) if final_nodes is None else final_nodes
 
     rsm_states = [
         (N.value, state.value)
@@ -46,84 +78,120 @@ def cfpq_with_tensor(
         for final_state in box.dfa.final_states
     }
 
-    rsm_mat = {}
+    rsm_edges = {}
     for N, box in rsm.boxes.items():
         for from_state, transitions in box.dfa.to_dict().items():
             for symbol, to_state in transitions.items():
-                from_idx = rsm_state_to_idx[(N.value, from_state.value)]
-                to_idx = rsm_state_to_idx[(N.value, to_state.value)]
-                rsm_mat.setdefault(
-                    symbol.value,
-                    dok_matrix((len(rsm_states), len(rsm_states)), dtype=bool),
-                )[from_idx, to_idx] = True
-
-    graph_nfa = graph_to_nfa(graph, start_nodes, final_nodes)
-    graph_states = [state.value for state in graph_nfa.states]
-    graph_state_to_idx = {state: i for i, state in enumerate(graph_states)}
-    graph_mat = {}
-    for from_state, transitions in graph_nfa.to_dict().items():
-        for symbol, to_states in transitions.items():
-            if not isinstance(to_states, set):
-                to_states = {to_states}
-            for to_state in to_states:
-                from_idx = graph_state_to_idx[from_state.value]
-                to_idx = graph_state_to_idx[to_state.value]
-                graph_mat.setdefault(
-                    symbol.value,
-                    dok_matrix((len(graph_states), len(graph_states)), dtype=bool),
-                )[from_idx, to_idx] = True
-
-    idx_to_state = {
-        i: state for i, state in enumerate(product(graph_states, rsm_states))
+                rows, cols = rsm_edges.setdefault(symbol.value, ([], []))
+                rows.append(rsm_state_to_idx[(N.value, from_state.value)])
+                cols.append(rsm_state_to_idx[(N.value, to_state.value)])
+
+    n_rsm_states = len(rsm_states)
+    n_graph_states = graph.number_of_nodes()
+    n = n_rsm_states * n_graph_states
+
+    backend = get_backend(
+        backend,
+        n,
+        sum(
+            graph.adjacency[symbol].nnz * len(rows)
+            for symbol, (rows, _) in rsm_edges.items()
+            if symbol in graph.adjacency
+        ),
+    )
+    rsm_mat = {
+        symbol: backend.matrix(rows, cols, (n_rsm_states, n_rsm_states))
+        for symbol, (rows, cols) in rsm_edges.items()
     }
+    graph_mat = {l: backend.convert(m) for l, m in graph.adjacency.items()}
 
-    n_nonzero = 0
-    while True:
-        n_rsm_states = len(rsm_states)
-        n_graph_states = len(graph_nfa.states)
-        n = n_rsm_states * n_graph_states
-        symbols = rsm_mat.keys() & graph_mat.keys()
-        if symbols:
-            mat = {
-                symbol: kron(graph_mat[symbol], rsm_mat[symbol]) for symbol in symbols
-            }
-            m = sum(mat.values())
-        else:
-            m = dok_matrix((n, n), dtype=bool)
-        m += eye(n, dtype=bool)
+    # index of the box an rsm state starts / ends, never-equal sentinels otherwise
+    box_start = np.full(n_rsm_states, -1)
+    box_final = np.full(n_rsm_states, -2)
+    Ns = [N.value for N in rsm.boxes]
+    for i, (N, state) in enumerate(rsm_states):
+        if (N, state) in rsm_start_states:
+            box_start[i] = Ns.index(N)
+        if (N, state) in rsm_final_states:
+            box_final[i] = Ns.index(N)
 
-        for _ in range(n):
-            m += m @ m
-        new_n_nonzero = m.count_nonzero()
-        if new_n_nonzero <= n_nonzero:
-            break
-        else:
-            n_nonzero = new_n_nonzero
-
-        for from_idx, to_idx in zip(*m.nonzero()):
-            from_state = idx_to_state[from_idx]
-            to_state = idx_to_state[to_idx]
-            from_rsm_state = from_state[1]
-            to_rsm_state = to_state[1]
-            if from_rsm_state in rsm_start_states and to_rsm_state in rsm_final_states:
-                N = from_rsm_state[0]
-                from_graph_idx = graph_state_to_idx[from_state[0]]
-                to_graph_idx = graph_state_to_idx[to_state[0]]
-                graph_mat.setdefault(
-                    N, dok_matrix((len(graph_states), len(graph_states)), dtype=bool)
-                )[from_graph_idx, to_graph_idx] = True
+    def product_matrix(mats):
+        m = backend.zeros((n, n))
+        for symbol in rsm_mat.keys() & mats.keys():
+            m = backend.union(m, backend.kron(mats[symbol], rsm_mat[symbol]))
+        return m
+
+    def nonterminal_edges(changed):
+        rows, cols = backend.nonzero(changed)
+        from_graph, from_rsm = np.divmod(rows, n_rsm_states)
+        to_graph, to_rsm = np.divmod(cols, n_rsm_states)
+        sel = box_start[from_rsm] == box_final[to_rsm]
+        boxes = box_start[from_rsm[sel]]
+        from_graph, to_graph = from_graph[sel], to_graph[sel]
+
+        new_edges = {}
+        for b, N in enumerate(Ns):
+            mask = boxes == b
+            if not mask.any():
+                continue
+            edges = backend.matrix(
+                from_graph[mask], to_graph[mask], (n_graph_states, n_graph_states)
+            )
+            if N in graph_mat:
+                edges = backend.difference(edges, graph_mat[N])
+            if backend.nnz(edges) != 0:
+                new_edges[N] = edges
+        return new_edges
 
     S = rsm.initial_label.value
-    if S not in graph_mat:
-        return set()
-
-    res = set()
-    for from_graph_state, to_graph_state in product(start_nodes, final_nodes):
-        if graph_mat[S][
-            graph_state_to_idx[from_graph_state], graph_state_to_idx[to_graph_state]
-        ]:
-            res.add((from_graph_state, to_graph_state))
-    return res
+    nodes = graph.nodes
+
+    # edges of S are only ever added, each exactly once
+    def pairs(m):
+        for i, j in zip(*backend.nonzero(m)):
+            if nodes[i] in start_nodes and nodes[j] in final_nodes:
+                yield nodes[i], nodes[j]
+
+    if S in graph_mat:
+        yield from pairs(graph_mat[S])
+
+    # the closure is computed once and then only extended with the product
+    # edges induced by newly found nonterminal edges
+    closure = transitive_closure(
+        backend.union(product_matrix(graph_mat), backend.eye(n)), backend
+    )
+    changed = closure
+    while True:
+        new_edges = nonterminal_edges(changed)
+        if not new_edges:
+            break
+        for N, edges in new_edges.items():
+            graph_mat[N] = (
+                backend.union(graph_mat[N], edges) if N in graph_mat else edges
+            )
+        if S in new_edges:
+            yield from pairs(new_edges[S])
+
+        # a new edge u -> v only adds paths x -> u -> v -> y, so each round
+        # touches the closure columns of the delta sources and the rows of
+        # the delta targets instead of the whole matrix
+        delta = product_matrix(new_edges)
+        rows, cols = backend.nonzero(delta)
+        src, dst = np.unique(rows), np.unique(cols)
+        step = backend.cols(backend.rows(delta, src), dst)
+        changed = backend.zeros((n, n))
+        while True:
+            update = backend.difference(
+                backend.matmul(
+                    backend.matmul(backend.cols(closure, src), step),
+                    backend.rows(closure, dst),
+                ),
+                closure,
+            )
+            if backend.nnz(update) == 0:
+                break
+            closure = backend.union(closure, update)
+            changed = backend.union(changed, update)
 
 
 def cfg_to_rsm(cfg: CFG) -> RecursiveAutomaton:
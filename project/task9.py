@@ -1,98 +1,324 @@
+from project.graph import LabeledGraph, as_labeled_graph
 from project.task8 import cfg_to_rsm
 
 from pyformlang.rsa import RecursiveAutomaton
 from pyformlang.cfg import CFG
-from pyformlang.finite_automaton import State, Symbol
 
 import networkx as nx
+import weakref
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterator, Optional
 
-from copy import deepcopy
+
+class GllSolver:
+    """
+    GLL over a recursive state machine compiled once into integer tables.
+    Descriptors are (rsm state, graph node, gss node) tuples of ints and a
+    gss node (N, v) is packed as box_of(N) * number_of_nodes + v.
+    """
+
+    def __init__(self, rsm: RecursiveAutomaton, graph: LabeledGraph):
+        self.graph = graph
+        n = self.n = graph.number_of_nodes()
+
+        boxes = list(rsm.boxes.items())
+        box_to_idx = {N: b for b, (N, _) in enumerate(boxes)}
+        self.initial_box = box_to_idx[rsm.initial_label]
+
+        state_to_idx = {}
+        for b, (_, box) in enumerate(boxes):
+            for state in box.dfa.states:
+                state_to_idx[(b, state)] = len(state_to_idx)
+
+        self.box_start = [
+            state_to_idx[(b, box.dfa.start_state)] for b, (_, box) in enumerate(boxes)
+        ]
+        self.is_final = [False] * len(state_to_idx)
+        for b, (_, box) in enumerate(boxes):
+            for state in box.dfa.final_states:
+                self.is_final[state_to_idx[(b, state)]] = True
+
+        # graph adjacency per label as plain lists, so that a step is list
+        # slicing and no numpy or networkx call
+        adjacency = {
+            label: (m.indptr.tolist(), m.indices.tolist())
+            for label, m in graph.adjacency.items()
+        }
+
+        # per rsm state: terminal moves (indptr, indices, to) and calls (box, to)
+        self.terms = [[] for _ in state_to_idx]
+        self.calls = [[] for _ in state_to_idx]
+        for b, (_, box) in enumerate(boxes):
+            for state, transitions in box.dfa.to_dict().items():
+                st = state_to_idx[(b, state)]
+                for symbol, tos in transitions.items():
+                    for to in tos if isinstance(tos, set) else {tos}:
+                        to = state_to_idx[(b, to)]
+                        if symbol in box_to_idx:
+                            self.calls[st].append((box_to_idx[symbol], to))
+                        elif symbol.value in adjacency:
+                            indptr, indices = adjacency[symbol.value]
+                            self.terms[st].append((indptr, indices, to))
+
+        self.stack_graph = {}
+        self.popped = {}
+        self.visited = set()
+        self.to_visit = []
+        # (start, end) pairs of the initial nonterminal popped since the
+        # last drain, for streaming answers while the search runs
+        self.found = []
+
+    def _add(self, descriptor: tuple[int, int, int]):
+        if descriptor not in self.visited:
+            self.visited.add(descriptor)
+            self.to_visit.append(descriptor)
+
+    def add_starts(self, start_nodes: set[int]):
+        for v in start_nodes:
+            gss = self.initial_box * self.n + v
+            self.stack_graph.setdefault(gss, set())
+            self._add((self.box_start[self.initial_box], v, gss))
+
+    def step(self):
+        state, node, gss = self.to_visit.pop()
+
+        if self.is_final[state]:
+            ends = self.popped.setdefault(gss, set())
+            if node not in ends:
+                ends.add(node)
+                if gss // self.n == self.initial_box:
+                    self.found.append((gss % self.n, node))
+                for to_gss, to_state in self.stack_graph.get(gss, ()):
+                    self._add((to_state, node, to_gss))
+
+        for box, to in self.calls[state]:
+            new_gss = box * self.n + node
+            returns = self.stack_graph.setdefault(new_gss, set())
+            if (gss, to) not in returns:
+                returns.add((gss, to))
+                for end in self.popped.get(new_gss, ()):
+                    self._add((to, end, gss))
+            self._add((self.box_start[box], node, new_gss))
+
+        for indptr, indices, to in self.terms[state]:
+            for next_node in indices[indptr[node] : indptr[node + 1]]:
+                self._add((to, next_node, gss))
+
+    def run(self):
+        while self.to_visit:
+            self.step()
+
+    def reachable(self, start_node: int) -> set[int]:
+        return self.popped.get(self.initial_box * self.n + start_node, set())
+
+
+def _to_rsm(cfg_or_rsm: CFG | RecursiveAutomaton) -> RecursiveAutomaton:
+    if isinstance(cfg_or_rsm, RecursiveAutomaton):
+        return cfg_or_rsm
+    return cfg_to_rsm(cfg_or_rsm)
+
+
+class GllSummaryCache:
+    """
+    Solvers kept per (graph, grammar), so that the popped and stack_graph
+    summaries of one query serve the next. Grammars given as CFG are keyed
+    by their text, RSMs by identity. Entries go away with their graph and
+    are rebuilt once graph.version has moved on.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._solvers = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def key(cfg_or_rsm: CFG | RecursiveAutomaton) -> tuple:
+        if isinstance(cfg_or_rsm, RecursiveAutomaton):
+            return "rsm", id(cfg_or_rsm)
+        return "cfg", cfg_or_rsm.to_text()
+
+    def get(
+        self, cfg_or_rsm: CFG | RecursiveAutomaton, graph: LabeledGraph
+    ) -> GllSolver:
+        solvers = self._solvers.setdefault(graph, OrderedDict())
+        key = self.key(cfg_or_rsm)
+
+        # the entry keeps its rsm alive, so an id key cannot be reused
+        entry = solvers.get(key)
+        if entry is not None and entry[0] == graph.version:
+            self.hits += 1
+            solvers.move_to_end(key)
+            return entry[2]
+
+        self.misses += 1
+        solver = GllSolver(_to_rsm(cfg_or_rsm), graph)
+        solvers[key] = (graph.version, cfg_or_rsm, solver)
+        while len(solvers) > self.maxsize:
+            solvers.popitem(last=False)
+        return solver
+
+    def clear(self):
+        self._solvers.clear()
+        self.hits = self.misses = 0
+
+    def info(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "graphs": len(self._solvers),
+            "maxsize": self.maxsize,
+        }
+
+
+_summary_cache = GllSummaryCache()
+
+
+def configure_gll_summary_cache(maxsize: int = 8) -> GllSummaryCache:
+    global _summary_cache
+    _summary_cache = GllSummaryCache(maxsize)
+    return _summary_cache
+
+
+def gll_summary_cache_info() -> dict[str, int]:
+    return _summary_cache.info()
+
+
+def _solver(
+    cfg_or_rsm: CFG | RecursiveAutomaton, graph: LabeledGraph, use_cache: bool
+) -> GllSolver:
+    if use_cache:
+        return _summary_cache.get(cfg_or_rsm, graph)
+    return GllSolver(_to_rsm(cfg_or_rsm), graph)
+
+
+class GllQuery:
+    """
+    Point lookups on one (rsm, graph) pair. Every source is added to the
+    same solver, so stack_graph and popped summaries found for earlier
+    sources are reused, and a lookup stops stepping as soon as its answer
+    is known, leaving the rest of the worklist for later lookups.
+    """
+
+    def __init__(
+        self,
+        cfg_or_rsm: CFG | RecursiveAutomaton,
+        graph: nx.DiGraph | LabeledGraph,
+        use_cache: bool = True,
+    ):
+        self.graph = as_labeled_graph(graph)
+        self.cfg_or_rsm = cfg_or_rsm
+        self.use_cache = use_cache
+        self._own_solver = None if use_cache else GllSolver(_to_rsm(cfg_or_rsm), graph)
+
+    @property
+    def solver(self) -> GllSolver:
+        # looked up on every use, so a mutated graph gets a fresh solver
+        if self.use_cache:
+            return _summary_cache.get(self.cfg_or_rsm, self.graph)
+        return self._own_solver
+
+    def _search(self, start: int, finals: set[int]) -> bool:
+        solver = self.solver
+        if not finals.isdisjoint(solver.reachable(start)):
+            return True
+
+        solver.found.clear()
+        solver.add_starts({start})
+        while solver.to_visit:
+            solver.step()
+            if solver.found:
+                if any(s == start and f in finals for s, f in solver.found):
+                    return True
+                solver.found.clear()
+        return False
+
+    def exists(self, start_node, final_nodes: set = None) -> bool:
+        # is any of final_nodes (any node by default) reachable from start_node
+        if start_node not in self.graph.node_to_idx:
+            return False
+        finals = (
+            set(range(self.graph.number_of_nodes()))
+            if final_nodes is None
+            else {int(i) for i in self.graph.indices(final_nodes)}
+        )
+        return self._search(self.graph.node_to_idx[start_node], finals)
+
+    def contains(self, start_node, final_node) -> bool:
+        return self.exists(start_node, {final_node})
+
+    def reachable(self, start_node) -> set:
+        if start_node not in self.graph.node_to_idx:
+            return set()
+        start = self.graph.node_to_idx[start_node]
+        solver = self.solver
+        solver.add_starts({start})
+        solver.run()
+        solver.found.clear()
+        nodes = self.graph.nodes
+        return {nodes[f] for f in solver.reachable(start)}
 
 
 def cfpq_with_gll(
     cfg_or_rsm: CFG | RecursiveAutomaton,
-    graph: nx.DiGraph,
+    graph: nx.DiGraph | LabeledGraph,
     start_nodes: set[int] = None,
     final_nodes: set[int] = None,
+    use_cache: bool = True,
 ) -> set[tuple[int, int]]:
+    return set(
+        iter_cfpq_with_gll(
+            cfg_or_rsm, graph, start_nodes, final_nodes, use_cache=use_cache
+        )
+    )
 
-    rsm = (
-        cfg_or_rsm
-        if isinstance(cfg_or_rsm, RecursiveAutomaton)
-        else cfg_to_rsm(cfg_or_rsm)
+
+def iter_cfpq_with_gll(
+    cfg_or_rsm: CFG | RecursiveAutomaton,
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: set[int] = None,
+    final_nodes: set[int] = None,
+    limit: Optional[int] = None,
+    use_cache: bool = True,
+) -> Iterator[tuple[int, int]]:
+    return islice(
+        _gll_pairs(cfg_or_rsm, graph, start_nodes, final_nodes, use_cache), limit
     )
 
-    start_nodes = graph.nodes if start_nodes is None else start_nodes
-    final_nodes = graph.nodes if final_nodes is None else final_nodes
-
-    rsm_start_nonterminal = rsm.initial_label.value
-
-    stack_start_states = {
-        (rsm_start_nonterminal, start_node) for start_node in start_nodes
-    }
-    stack_graph = {st: set() for st in stack_start_states}
-
-    rsm_start_state = rsm.boxes[rsm.initial_label].dfa.start_state.value
-    visited = {
-        ((rsm_start_nonterminal, rsm_start_state), st[1], st)
-        for st in stack_start_states
-    }
-    to_visit = deepcopy(visited)
-
-    popped = {}
-    res = set()
-
-    while len(to_visit) != 0:
-        rsm_state, graph_node, stack_state = to_visit.pop()
-
-        if State(rsm_state[1]) in rsm.boxes[rsm_state[0]].dfa.final_states:
-            if stack_state in stack_start_states:
-                if graph_node in final_nodes:
-                    res.add((stack_state[1], graph_node))
-
-            popped.setdefault(stack_state, set()).add(graph_node)
-            for to_stack_state, to_rsm_state in stack_graph.setdefault(
-                stack_state, set()
-            ):
-                new_state = (to_rsm_state, graph_node, to_stack_state)
-                if new_state not in visited:
-                    to_visit.add(new_state)
-                    visited.add(new_state)
-
-        to_nodes = {}
-        for _, n, l in graph.edges(graph_node, data="label"):
-            to_nodes.setdefault(l, set()).add(n)
-
-        dfa_dict = rsm.boxes[Symbol(rsm_state[0])].dfa.to_dict()
-        if State(rsm_state[1]) not in dfa_dict:
-            continue
-        for symbol, to in dfa_dict[State(rsm_state[1])].items():
-            if symbol in rsm.labels:
-                new_stack_state = (symbol.value, graph_node)
-                if new_stack_state in popped:
-                    for to_graph_node in popped[new_stack_state]:
-                        new_state = (
-                            (rsm_state[0], to.value),
-                            to_graph_node,
-                            stack_state,
-                        )
-                        if new_state not in visited:
-                            to_visit.add(new_state)
-                            visited.add(new_state)
-                stack_graph.setdefault(new_stack_state, set()).add(
-                    (stack_state, (rsm_state[0], to.value))
-                )
-                start_state = rsm.boxes[symbol].dfa.start_state.value
-                new_state = ((symbol.value, start_state), graph_node, new_stack_state)
-                if new_state not in visited:
-                    to_visit.add(new_state)
-                    visited.add(new_state)
-            else:
-                if symbol.value not in to_nodes:
-                    continue
-                for node in to_nodes[symbol.value]:
-                    new_state = ((rsm_state[0], to.value), node, stack_state)
-                    if new_state not in visited:
-                        to_visit.add(new_state)
-                        visited.add(new_state)
-    return res
+
+def _gll_pairs(
+    cfg_or_rsm: CFG | RecursiveAutomaton,
+    graph: nx.DiGraph | LabeledGraph,
+    start_nodes: set[int] = None,
+    final_nodes: set[int] = None,
+    use_cache: bool = True,
+) -> Iterator[tuple[int, int]]:
+
+    graph = as_labeled_graph(graph)
+
+    start_nodes = set(graph.nodes) if start_nodes is None else start_nodes
+    final_nodes = set(graph.nodes) if final_nodes is None else final_nodes
+    start_nodes = {int(i) for i in graph.indices(start_nodes)}
+    final_nodes = {int(i) for i in graph.indices(final_nodes)}
+
+    solver = _solver(cfg_or_rsm, graph, use_cache)
+    solver.found.clear()
+
+    # summaries left by earlier queries answer their part of the starts
+    # right away, the search below only reports pairs popped after that
+    nodes = graph.nodes
+    for s in start_nodes:
+        for f in solver.reachable(s) & final_nodes:
+            yield nodes[s], nodes[f]
+
+    solver.add_starts(start_nodes)
+
+    # popped sets only grow, so every pair is final when it is popped
+    while solver.to_visit:
+        solver.step()
+        if solver.found:
+            for s, f in solver.found:
+                if s in start_nodes and f in final_nodes:
+                    yield nodes[s], nodes[f]
+            solver.found.clear()
@@ -1,5 +1,3 @@
-import cfpq_data
-from networkx.drawing import nx_pydot as pydot
 from typing import Tuple, Set
 
 
@@ -15,6 +13,9 @@ def graph_info(name_graph: str) -> Tuple[int, int, Set[str]]:
 def create_labeled_two_cycle_graph(
     countNode1: int, countNode2: int, nameLabels: Tuple[str, str], path: str
 ) -> None:
+    import cfpq_data
+    from networkx.drawing import nx_pydot as pydot
+
     pydot.write_dot(
         G=cfpq_data.labeled_two_cycles_graph(
             n=countNode1,
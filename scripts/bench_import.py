@@ -0,0 +1,36 @@
+import statistics
+import subprocess
+import sys
+import time
+
+import shared
+
+STATEMENTS = [
+    "import project",
+    "from project import regex_to_dfa",
+    "from project import cfpq_with_gll",
+    "from project import *",
+]
+
+
+def measure(statement: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, "-c", statement])
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    shared.configure_python_path()
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    baseline = measure("pass", repeat)
+    print(f"{'interpreter startup':40} {baseline * 1000:8.1f} ms")
+    for statement in STATEMENTS:
+        elapsed = measure(statement, repeat) - baseline
+        print(f"{statement:40} {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import cfpq_data
+import pytest
+from pyformlang.cfg import CFG
+from project.backend import BACKENDS, get_backend
+from project.closure import reachable_from, transitive_closure
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton, paths_ends
+from project.task4 import reachability_with_constraints
+from project.task7 import cfpq_with_matrix
+from project.task8 import cfpq_with_tensor
+
+DYCK = CFG.from_text("S -> a S b S | $")
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return cfpq_data.graphs.labeled_scale_free_graph(40, labels=["a", "b"], seed=11)
+
+
+def test_get_backend():
+    assert get_backend("csc") is BACKENDS["csc"]
+    assert get_backend(None, 100, 5000).name == "dense"
+    assert get_backend(None, 100, 50).name == "csr"
+    assert get_backend(None, 8000, 10**7).name == "bits"
+    assert get_backend(None, 100_000, 10**9).name == "csr"
+    with pytest.raises(ValueError):
+        get_backend("dok")
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_closure(graph, name):
+    backend = BACKENDS[name]
+    m = sum(FiniteAutomaton.from_graph(graph).matrix.values())
+
+    expected = transitive_closure(m).nonzero()
+    closure = transitive_closure(m, name)
+    assert sorted(zip(*backend.nonzero(closure))) == sorted(zip(*expected))
+
+    expected = reachable_from(m, [0, 5]).nonzero()
+    reachable = reachable_from(m, [0, 5], name)
+    assert sorted(zip(*backend.nonzero(reachable))) == sorted(zip(*expected))
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_regular_queries(graph, name):
+    starts, finals = set(range(0, 40, 3)), set(range(20))
+    fa = FiniteAutomaton.from_graph(graph, starts, finals)
+    constraints_fa = FiniteAutomaton(regex_to_dfa("a* b"))
+
+    assert reachability_with_constraints(
+        fa, constraints_fa, backend=name
+    ) == reachability_with_constraints(fa, constraints_fa, backend="csr")
+    assert sorted(paths_ends(graph, starts, finals, "(a | b)* b", backend=name)) == (
+        sorted(paths_ends(graph, starts, finals, "(a | b)* b", backend="csr"))
+    )
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+@pytest.mark.parametrize("engine", [cfpq_with_matrix, cfpq_with_tensor])
+def test_cfpq(graph, engine, name):
+    assert engine(DYCK, graph, backend=name) == engine(DYCK, graph, backend="csr")
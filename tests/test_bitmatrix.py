@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from project import bitmatrix
+from project.backend import SparseBackend
+from project.bitmatrix import BitMatrix, four_russians_matmul
+from project.closure import transitive_closure
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton, intersect_automata
+
+
+def random_bool(rng, shape, p=0.1):
+    return rng.random(shape) < p
+
+
+@pytest.fixture()
+def rng():
+    return np.random.default_rng(42)
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (5, 70), (64, 64), (130, 3)])
+def test_roundtrip(rng, shape):
+    dense = random_bool(rng, shape, 0.3)
+    m = BitMatrix.from_dense(dense)
+
+    assert (m.toarray() == dense).all()
+    assert m.nnz == dense.sum()
+    assert (m.tocsr().toarray() == dense).all()
+    rows, cols = dense.nonzero()
+    assert (BitMatrix.from_coo(rows, cols, shape).words == m.words).all()
+
+
+def test_operators(rng):
+    a, b = random_bool(rng, (40, 100)), random_bool(rng, (40, 100))
+    c = random_bool(rng, (100, 67))
+    A, B, C = (BitMatrix.from_dense(x) for x in (a, b, c))
+
+    assert ((A | B).toarray() == (a | b)).all()
+    assert ((A + B).toarray() == (a | b)).all()
+    assert ((A & B).toarray() == (a & b)).all()
+    assert ((A > B).toarray() == (a & ~b)).all()
+    assert ((A @ C).toarray() == ((a.astype(int) @ c.astype(int)) > 0)).all()
+    assert (sum([A, B]).toarray() == (a | b)).all()
+    with pytest.raises(ValueError):
+        A @ B
+
+
+def test_indexing_and_kron(rng):
+    a, b = random_bool(rng, (7, 90), 0.3), random_bool(rng, (3, 4), 0.5)
+    A, B = BitMatrix.from_dense(a), BitMatrix.from_dense(b)
+    idx = [3, 0, 89, 64]
+
+    assert (A[[1, 5]].toarray() == a[[1, 5]]).all()
+    assert (A[:, idx].toarray() == a[:, idx]).all()
+    assert (A[[2, 6], idx].toarray() == a[[2, 6]][:, idx]).all()
+    assert (A.T.toarray() == a.T).all()
+    assert (A.kron(B).toarray() == np.kron(a, b)).all()
+
+
+def test_transitive_closure(rng):
+    a = random_bool(rng, (100, 100), 0.02)
+
+    closure = transitive_closure(BitMatrix.from_dense(a), "bits")
+
+    assert (closure.toarray() == transitive_closure(a).toarray()).all()
+
+
+def test_finite_automaton_backend():
+    fa = FiniteAutomaton(regex_to_dfa("a b* c")).to_backend("bits")
+    query = FiniteAutomaton(regex_to_dfa("a b b* c"))
+
+    assert isinstance(next(iter(fa.matrix.values())), BitMatrix)
+    assert fa.accepts("abbc")
+    assert not fa.accepts("ab")
+    assert not fa.is_empty()
+
+    product = intersect_automata(fa, query, "bits")
+    assert isinstance(next(iter(product.matrix.values())), BitMatrix)
+    assert intersect_automata(fa, query).matrix["b"].nnz == product.matrix["b"].nnz
+
+
+@pytest.mark.parametrize("block", [1, 3, 5, 8, 16])
+@pytest.mark.parametrize("shape", [(3, 7, 2), (40, 130, 70), (300, 64, 65)])
+def test_four_russians_matmul(rng, block, shape):
+    n, k, m = shape
+    a, b = random_bool(rng, (n, k), 0.2), random_bool(rng, (k, m), 0.2)
+    expected = (a.astype(int) @ b.astype(int)) > 0
+
+    product = four_russians_matmul(
+        BitMatrix.from_dense(a), BitMatrix.from_dense(b), block
+    )
+
+    assert (product.toarray() == expected).all()
+
+
+@pytest.mark.parametrize("min_rows", [0, 10**9])
+def test_matmul_paths_agree(rng, monkeypatch, min_rows):
+    monkeypatch.setattr(bitmatrix, "FOUR_RUSSIANS_MIN_ROWS", min_rows)
+    a, b = random_bool(rng, (50, 90), 0.1), random_bool(rng, (90, 20), 0.1)
+
+    product = BitMatrix.from_dense(a) @ BitMatrix.from_dense(b)
+
+    assert (product.toarray() == ((a.astype(int) @ b.astype(int)) > 0)).all()
+
+
+def test_sparse_backend_dense_products(rng):
+    a = sp.csr_matrix(random_bool(rng, (100, 100), 0.1))
+    b = sp.csr_matrix(random_bool(rng, (100, 80), 0.1))
+
+    product = SparseBackend("csr", dense_product_density=0.0).matmul(a, b)
+
+    assert product.format == "csr"
+    assert (product != (a @ b)).nnz == 0
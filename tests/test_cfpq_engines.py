@@ -0,0 +1,84 @@
+import networkx as nx
+import pytest
+from pyformlang.cfg import CFG
+from project.task6 import cfpq_with_hellings
+from project.task7 import cfpq_with_matrix
+from project.task8 import cfpq_with_tensor
+from project.task9 import cfpq_with_gll
+
+
+def word_path(word: str) -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    G.add_nodes_from(range(len(word) + 1))
+    for i, label in enumerate(word):
+        G.add_edge(i, i + 1, label=label)
+    return G
+
+
+def two_cycles() -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    for i in range(3):
+        G.add_edge(i, (i + 1) % 3, label="a")
+    G.add_edge(0, 3, label="b")
+    G.add_edge(3, 0, label="b")
+    return G
+
+
+ANBN = CFG.from_text("S -> a S b | a b")
+ANBN_EPS = CFG.from_text("S -> a S b | $")
+DYCK = CFG.from_text("S -> a S b S | $")
+
+
+@pytest.mark.parametrize("engine", [cfpq_with_matrix, cfpq_with_hellings])
+def test_fixpoint_needs_several_rounds(engine):
+    G = word_path("aaaabbbb")
+
+    assert engine(ANBN, G) == {(0, 8), (1, 7), (2, 6), (3, 5)}
+
+
+@pytest.mark.parametrize("engine", [cfpq_with_matrix, cfpq_with_hellings])
+def test_epsilon_heads(engine):
+    G = word_path("aabb")
+    expected = {(i, i) for i in range(5)} | {(1, 3), (0, 4)}
+
+    assert engine(ANBN_EPS, G) == expected
+    assert engine(ANBN_EPS, G, {0}, {0, 4}) == {(0, 0), (0, 4)}
+
+
+@pytest.mark.parametrize("engine", [cfpq_with_matrix, cfpq_with_hellings])
+def test_joins_on_both_sides(engine):
+    # S -> a S b S derives facts that are extended both to the left (the
+    # popped fact is the right operand) and to the right (the left operand)
+    G = word_path("abaabbab")
+    result = engine(DYCK, G)
+
+    assert (0, 8) in result
+    assert (0, 2) in result and (2, 6) in result and (6, 8) in result
+    assert (1, 3) not in result
+
+
+def test_hellings_matches_matrix_on_cycles():
+    G = two_cycles()
+    cfg = CFG.from_text("S -> a S b | a b | S S")
+
+    assert cfpq_with_hellings(cfg, G) == cfpq_with_matrix(cfg, G)
+
+
+@pytest.mark.parametrize(
+    "cfg",
+    [ANBN, ANBN_EPS, DYCK, CFG.from_text("S -> a S b | a b | S S")],
+)
+@pytest.mark.parametrize("graph", [word_path("aaaabbbbab"), two_cycles()])
+def test_tensor_incremental_closure(cfg, graph):
+    # nested grammars on these graphs need several outer rounds, each of
+    # which only extends the closure with the new nonterminal edges
+    assert cfpq_with_tensor(cfg, graph) == cfpq_with_matrix(cfg, graph)
+
+
+@pytest.mark.parametrize("cfg", [ANBN, ANBN_EPS, DYCK])
+@pytest.mark.parametrize("graph", [word_path("aaaabbbbab"), two_cycles()])
+def test_gll_compiled_tables(cfg, graph):
+    assert cfpq_with_gll(cfg, graph) == cfpq_with_matrix(cfg, graph)
+    assert cfpq_with_gll(cfg, graph, {0}, {8, 0}) == cfpq_with_matrix(
+        cfg, graph, {0}, {8, 0}
+    )
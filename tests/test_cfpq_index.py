@@ -0,0 +1,66 @@
+import random
+
+import pytest
+from pyformlang.cfg import CFG
+from project.graph import LabeledGraph
+from project.task7 import MatrixCfpqIndex, cfpq_with_matrix
+
+GRAMMARS = [
+    CFG.from_text("S -> a S b S | $"),
+    CFG.from_text("S -> a S b | a b"),
+    CFG.from_text("S -> S S | a | b c"),
+]
+
+
+def random_edges(rng, n, count):
+    return [
+        (rng.randrange(n), rng.choice("abc"), rng.randrange(n)) for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("cfg", GRAMMARS)
+@pytest.mark.parametrize("backend", ["csr", "bits"])
+def test_updates_match_recomputation(cfg, backend):
+    rng = random.Random(7)
+    edges = random_edges(rng, 12, 20)
+    graph = LabeledGraph.from_edges(edges, nodes=range(12))
+    index = MatrixCfpqIndex(cfg, graph, backend)
+    assert index.query() == cfpq_with_matrix(cfg, graph)
+
+    for step in range(12):
+        if step % 3 == 2:
+            removed = rng.sample(edges, 3)
+            for edge in removed:
+                edges.remove(edge)
+            index.remove_edges(removed)
+        else:
+            added = random_edges(rng, 14, 3)
+            edges += added
+            index.add_edges(added)
+
+        expected = cfpq_with_matrix(cfg, LabeledGraph.from_edges(edges, graph.nodes))
+        assert index.query() == expected
+
+
+def test_parallel_copies_and_missing_edges():
+    cfg = CFG.from_text("S -> a b")
+    graph = LabeledGraph.from_edges([(0, "a", 1), (0, "a", 1), (1, "b", 2)])
+    index = MatrixCfpqIndex(cfg, graph)
+
+    index.remove_edges([(0, "a", 1), (5, "a", 6), (1, "c", 2)])
+    assert index.query() == {(0, 2)}
+
+    index.remove_edges([(0, "a", 1)])
+    assert index.query() == set()
+    assert index.query({0}, {2}) == set()
+
+
+def test_external_graph_changes_rebuild():
+    cfg = CFG.from_text("S -> a b")
+    graph = LabeledGraph.from_edges([(0, "a", 1)])
+    index = MatrixCfpqIndex(cfg, graph)
+
+    graph.add_edges([(1, "b", 2)])
+
+    assert index.query() == {(0, 2)}
+    assert index.query({1}) == set()
@@ -0,0 +1,27 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from project.closure import reachable_from, transitive_closure
+
+
+def path_matrix(n: int) -> csr_matrix:
+    return csr_matrix(
+        (np.ones(n - 1, dtype=bool), (np.arange(n - 1), np.arange(1, n))),
+        shape=(n, n),
+    )
+
+
+def test_transitive_closure():
+    closure = transitive_closure(path_matrix(6)).toarray()
+
+    assert closure.sum() == 15
+    assert np.array_equal(closure, np.triu(np.ones((6, 6), dtype=bool), k=1))
+
+
+def test_reachable_from():
+    m = path_matrix(6).tolil()
+    m[5, 3] = True
+
+    reachable = reachable_from(m, [4, 0]).toarray()
+
+    assert set(np.flatnonzero(reachable[0])) == {3, 4, 5}
+    assert set(np.flatnonzero(reachable[1])) == {1, 2, 3, 4, 5}
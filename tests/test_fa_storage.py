@@ -0,0 +1,45 @@
+import numpy as np
+import cfpq_data
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton
+from project.task4 import reachability_with_constraints
+
+
+def backed_by_memmap(arr):
+    while isinstance(arr, np.ndarray):
+        if isinstance(arr, np.memmap):
+            return True
+        arr = arr.base
+    return False
+
+
+def test_save_load_roundtrip(tmp_path):
+    graph = cfpq_data.graphs.labeled_scale_free_graph(40, labels=["a", "b"], seed=3)
+    fa = FiniteAutomaton.from_graph(graph, {0, 1, 2}, {3, 4, 5, 6})
+    path = str(tmp_path / "graph.fa")
+
+    fa.save(path)
+    loaded = FiniteAutomaton.load(path)
+
+    assert [s.value for s in loaded.states_list] == [s.value for s in fa.states_list]
+    assert loaded.start_states == fa.start_states
+    assert loaded.final_states == fa.final_states
+    for label, m in fa.matrix.items():
+        assert (loaded.matrix[label] != m).nnz == 0
+        assert backed_by_memmap(loaded.matrix[label].indices)
+
+    constraints_fa = FiniteAutomaton(regex_to_dfa("a* b"))
+    assert reachability_with_constraints(
+        loaded, constraints_fa
+    ) == reachability_with_constraints(fa, constraints_fa)
+
+
+def test_save_load_regex_automaton(tmp_path):
+    fa = FiniteAutomaton(regex_to_dfa("a (b | c)*"))
+    path = str(tmp_path / "regex.fa")
+
+    fa.save(path)
+    loaded = FiniteAutomaton.load(path)
+
+    assert loaded.accepts("abcb")
+    assert not loaded.accepts("ba")
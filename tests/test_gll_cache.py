@@ -0,0 +1,80 @@
+import pytest
+from pyformlang.cfg import CFG
+from project.graph import LabeledGraph
+from project.task9 import (
+    GllQuery,
+    GllSummaryCache,
+    cfpq_with_gll,
+    configure_gll_summary_cache,
+    gll_summary_cache_info,
+)
+from project.task8 import cfg_to_rsm
+
+ANBN = CFG.from_text("S -> a S b | a b")
+
+
+@pytest.fixture()
+def cache():
+    yield configure_gll_summary_cache()
+    configure_gll_summary_cache()
+
+
+def word_graph(word):
+    return LabeledGraph.from_edges([(i, label, i + 1) for i, label in enumerate(word)])
+
+
+def test_summaries_shared_between_start_sets(cache):
+    graph = word_graph("aaabbb")
+
+    assert cfpq_with_gll(ANBN, graph, {0}) == {(0, 6)}
+    assert cfpq_with_gll(ANBN, graph, {1, 2}) == {(1, 5), (2, 4)}
+    assert cfpq_with_gll(ANBN, graph, {0, 1}, {6}) == {(0, 6)}
+    assert gll_summary_cache_info()["misses"] == 1
+    assert gll_summary_cache_info()["hits"] == 2
+
+
+def test_graph_version_invalidates(cache):
+    graph = word_graph("aabb")
+    assert cfpq_with_gll(ANBN, graph) == {(0, 4), (1, 3)}
+
+    graph.add_edges([(4, "b", 5), (5, "b", 6), ("x", "a", 0)])
+
+    assert graph.version == 1
+    assert cfpq_with_gll(ANBN, graph) == {(0, 4), (1, 3), ("x", 5)}
+    assert gll_summary_cache_info()["misses"] == 2
+
+
+def test_rsm_keyed_by_identity(cache):
+    graph = word_graph("ab")
+    rsm = cfg_to_rsm(ANBN)
+
+    cfpq_with_gll(rsm, graph)
+    cfpq_with_gll(rsm, graph)
+    cfpq_with_gll(cfg_to_rsm(ANBN), graph)
+
+    assert gll_summary_cache_info()["hits"] == 1
+    assert gll_summary_cache_info()["misses"] == 2
+
+
+def test_eviction_and_uncached():
+    cache = GllSummaryCache(maxsize=1)
+    graph = word_graph("ab")
+
+    cache.get(ANBN, graph)
+    cache.get(CFG.from_text("S -> a"), graph)
+    cache.get(ANBN, graph)
+
+    assert cache.info()["misses"] == 3
+    assert cfpq_with_gll(ANBN, graph, use_cache=False) == {(0, 2)}
+
+
+def test_query_follows_graph_updates(cache):
+    graph = word_graph("ab")
+    query = GllQuery(ANBN, graph)
+    assert not query.contains(0, 3)
+
+    graph.add_edges([(2, "a", 3)])
+    graph.add_edges([(3, "b", 4)])
+
+    assert query.contains(2, 4)
+    assert query.reachable(0) == {2}
@@ -0,0 +1,46 @@
+import cfpq_data
+import pytest
+from pyformlang.cfg import CFG
+from project.task9 import GllQuery, cfpq_with_gll
+
+DYCK = CFG.from_text("S -> a S b S | $")
+ANBN = CFG.from_text("S -> a S b | a b")
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return cfpq_data.graphs.labeled_scale_free_graph(40, labels=["a", "b"], seed=4)
+
+
+@pytest.mark.parametrize("cfg", [DYCK, ANBN])
+def test_point_lookups_match_all_pairs(graph, cfg):
+    expected = cfpq_with_gll(cfg, graph)
+    query = GllQuery(cfg, graph)
+
+    for u in graph.nodes:
+        for v in graph.nodes:
+            assert query.contains(u, v) == ((u, v) in expected)
+
+
+@pytest.mark.parametrize("cfg", [DYCK, ANBN])
+def test_per_source(graph, cfg):
+    expected = cfpq_with_gll(cfg, graph)
+    query = GllQuery(cfg, graph)
+    finals = set(range(10))
+
+    for u in graph.nodes:
+        reached = {v for s, v in expected if s == u}
+        assert query.exists(u, finals) == bool(reached & finals)
+        assert query.reachable(u) == reached
+        assert query.exists(u) == bool(reached)
+
+
+def test_early_exit_keeps_pending_work(graph):
+    query = GllQuery(DYCK, graph)
+
+    assert query.contains(0, 0)
+    assert query.solver.popped
+
+    assert not query.contains(0, "missing")
+    assert not query.exists("missing")
+    assert query.reachable("missing") == set()
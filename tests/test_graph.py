@@ -0,0 +1,112 @@
+import networkx as nx
+from pyformlang.cfg import CFG
+from project.graph import LabeledGraph, as_labeled_graph
+from project.task2 import graph_to_nfa
+from project.task3 import FiniteAutomaton, paths_ends
+from project.task6 import cfpq_with_hellings
+from project.task7 import cfpq_with_matrix
+from project.task8 import cfpq_with_tensor
+from project.task9 import cfpq_with_gll
+
+
+def test_from_networkx():
+    G = nx.MultiDiGraph()
+    G.add_nodes_from(["x", "y", "z", "w"])
+    G.add_edges_from(
+        [
+            ("x", "y", {"label": "a"}),
+            ("y", "z", {"label": "b"}),
+            ("x", "y", {"label": "a"}),
+            ("z", "x", {"label": "a"}),
+        ]
+    )
+
+    lg = LabeledGraph.from_networkx(G)
+
+    assert lg.number_of_nodes() == 4
+    assert lg.number_of_edges() == 4
+    assert set(lg.adjacency.keys()) == {"a", "b"}
+    assert lg.adjacency["a"].nnz == 2
+    a = lg.adjacency["a"]
+    assert a[lg.node_to_idx["x"], lg.node_to_idx["y"]]
+    assert a[lg.node_to_idx["z"], lg.node_to_idx["x"]]
+    assert set(lg.triples()) == {("x", "a", "y"), ("y", "b", "z"), ("z", "a", "x")}
+    assert as_labeled_graph(lg) is lg
+
+
+def test_from_edges():
+    lg = LabeledGraph.from_edges([(1, "a", 2), (2, "b", 3)], nodes=[0])
+
+    assert lg.nodes == [0, 1, 2, 3]
+    assert lg.adjacency["b"][2, 3]
+    assert list(lg.indices([3, 7, 0])) == [3, 0]
+
+
+def test_finite_automaton_from_graph():
+    G = nx.MultiDiGraph()
+    G.add_edges_from(
+        [
+            (0, 1, {"label": "a"}),
+            (1, 2, {"label": "b"}),
+            (2, 0, {"label": "a"}),
+        ]
+    )
+
+    fa = FiniteAutomaton.from_graph(G, {0}, {2})
+    nfa_fa = FiniteAutomaton(graph_to_nfa(G, {0}, {2}))
+
+    assert fa.accepts("ab")
+    assert not fa.accepts("aba")
+    assert {s.value for s in fa.states_list} == {s.value for s in nfa_fa.states_list}
+    for label, m in nfa_fa.matrix.items():
+        assert fa.matrix[label].nnz == m.nnz
+
+
+def test_engines_accept_labeled_graph():
+    G = nx.MultiDiGraph()
+    G.add_edges_from(
+        [
+            ("x", "y", {"label": "a"}),
+            ("y", "z", {"label": "b"}),
+            ("z", "w", {"label": "b"}),
+        ]
+    )
+    cfg = CFG.from_text("S -> a S b | a b")
+    lg = LabeledGraph.from_networkx(G)
+
+    expected = {("x", "z")}
+    assert cfpq_with_hellings(cfg, G) == expected
+    assert cfpq_with_hellings(cfg, lg) == expected
+    assert cfpq_with_matrix(cfg, lg) == expected
+    assert cfpq_with_tensor(cfg, lg) == expected
+    assert cfpq_with_gll(cfg, lg) == expected
+
+
+def test_from_graph_keeps_unknown_nodes():
+    G = nx.MultiDiGraph()
+    G.add_edge(0, 1, label="a")
+
+    fa = FiniteAutomaton.from_graph(G, {0, 5}, {1, 5})
+
+    assert fa.size() == 3
+    assert fa.matrix["a"].shape == (3, 3)
+    assert set(paths_ends(G, {0, 5}, {1, 5}, "a*")) == {(0, 1), (5, 5)}
+
+
+def test_add_edges():
+    lg = LabeledGraph.from_edges([(0, "a", 1), (1, "b", 2)])
+
+    lg.add_edges([(2, "a", 0), (0, "c", 1)])
+    assert lg.version == 1
+    assert lg.adjacency["a"].nnz == 2 and lg.adjacency["a"][2, 0]
+    assert lg.adjacency["c"][0, 1]
+
+    lg.add_edges([(2, "b", "new")])
+    assert lg.version == 2
+    assert lg.number_of_nodes() == 4
+    assert all(m.shape == (4, 4) for m in lg.adjacency.values())
+    assert lg.adjacency["b"][2, 3]
+    assert lg.number_of_edges() == 5
+
+    lg.add_edges([])
+    assert lg.version == 2
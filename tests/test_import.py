@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+import project
+
+
+def test_public_api_resolves():
+    for name in project.__all__:
+        assert callable(getattr(project, name))
+
+
+def test_import_is_lazy():
+    code = (
+        "import sys, project; "
+        "assert 'cfpq_data' not in sys.modules; "
+        "assert 'project.task9' not in sys.modules; "
+        "project.regex_to_dfa; "
+        "assert 'scipy.sparse' not in sys.modules"
+    )
+    subprocess.check_call([sys.executable, "-c", code])
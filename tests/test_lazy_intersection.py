@@ -0,0 +1,48 @@
+import cfpq_data
+import pytest
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton, paths_ends
+from project.task4 import reachability_with_constraints
+
+REGEXES = ["a*", "a b*", "(a | b)* c", "b (a | c)*", "a b c"]
+
+
+@pytest.fixture(params=range(3))
+def graph(request):
+    return cfpq_data.graphs.labeled_scale_free_graph(
+        30, labels=["a", "b", "c"], seed=request.param
+    )
+
+
+@pytest.mark.parametrize("regex", REGEXES)
+def test_lazy_paths_ends(graph, regex):
+    start_nodes, final_nodes = {0, 1, 2, 5}, {1, 3, 4, 5, 8}
+
+    eager = paths_ends(graph, start_nodes, final_nodes, regex)
+    lazy = paths_ends(graph, start_nodes, final_nodes, regex, lazy=True)
+
+    assert set(lazy) == set(eager)
+
+
+@pytest.mark.parametrize("regex", REGEXES)
+def test_lazy_reachability(graph, regex):
+    fa = FiniteAutomaton.from_graph(graph, {0, 3, 7}, {0, 2, 4, 6, 9})
+    constraints_fa = FiniteAutomaton(regex_to_dfa(regex))
+
+    eager = reachability_with_constraints(fa, constraints_fa)
+    lazy = reachability_with_constraints(fa, constraints_fa, lazy=True)
+
+    assert lazy == eager
+
+
+@pytest.mark.parametrize("regex", REGEXES)
+def test_lazy_all_starts_dense(regex):
+    graph = cfpq_data.graphs.labeled_binomial_graph(
+        25, 0.2, labels=["a", "b", "c"], seed=7
+    )
+    nodes = set(graph.nodes)
+
+    eager = paths_ends(graph, nodes, nodes, regex)
+    lazy = paths_ends(graph, nodes, nodes, regex, lazy=True)
+
+    assert set(lazy) == set(eager)
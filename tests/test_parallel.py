@@ -0,0 +1,36 @@
+import cfpq_data
+import pytest
+from project.parallel import chunked
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton, paths_ends
+from project.task4 import reachability_with_constraints
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return cfpq_data.graphs.labeled_scale_free_graph(60, labels=["a", "b"], seed=7)
+
+
+def test_chunked():
+    assert chunked([1, 2, 3, 4, 5], 2) == [[1, 2, 3], [4, 5]]
+    assert chunked([1, 2], 4) == [[1], [2]]
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_parallel_reachability_with_constraints(graph, lazy):
+    fa = FiniteAutomaton.from_graph(graph, set(range(0, 60, 3)), set(range(30)))
+    constraints_fa = FiniteAutomaton(regex_to_dfa("a* b (a | b)*"))
+
+    expected = reachability_with_constraints(fa, constraints_fa, lazy=lazy)
+    actual = reachability_with_constraints(fa, constraints_fa, lazy=lazy, processes=2)
+
+    assert actual == expected
+
+
+def test_parallel_paths_ends(graph):
+    starts, finals = set(range(0, 60, 2)), set(range(10, 50))
+
+    for regex in ["a b*", "(a | b)*", "b a a*"]:
+        expected = paths_ends(graph, starts, finals, regex)
+        actual = paths_ends(graph, starts, finals, regex, processes=3)
+        assert sorted(actual) == sorted(expected)
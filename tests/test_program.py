@@ -0,0 +1,186 @@
+import random
+
+import pytest
+from project import task12
+from project.task12 import (
+    CFPQ_ENGINES,
+    CfpqCostModel,
+    Plan,
+    exec_program,
+    explain_program,
+    parse_program,
+    typing_program,
+)
+from project.graph import LabeledGraph
+from project.task7 import cfpq_with_matrix
+from pyformlang.cfg import CFG
+
+PROGRAM = """
+let g is graph
+add edge (1, "a", 2) to g
+add edge (2, "b", 3) to g
+add edge (3, "a", 1) to g
+let q = ("a" . "b") ^ [1..]
+let p = "a" . p . "b" | "a" . "b"
+let both = p & q
+let ab = q & ("a" . "b")
+let r1 = for v in [1] return v, u where u reachable from v in g by q
+let r2 = return u, v where u reachable from v in g by p
+let r3 = for v in [1] return u where u reachable from v in g by both
+let r4 = for u in [3] return v where u reachable from v in g by ab
+let r5 = for v in [1, 2, 3] return u, v where u reachable from v in g by "a" ^ [0..1]
+remove vertex 3 from g
+let r6 = return v, u where u reachable from v in g by "a" ^ [1..2]
+"""
+
+
+def test_exec_program():
+    assert exec_program(PROGRAM) == {
+        "r1": {(1, 3)},
+        "r2": {(1, 3)},
+        "r3": {3},
+        "r4": {1},
+        "r5": {(1, 1), (2, 2), (3, 3), (1, 2), (3, 1)},
+        "r6": {(1, 2)},
+    }
+
+
+def test_consecutive_edges_are_loaded_at_once():
+    plan = Plan(PROGRAM)
+    kinds = [step[0] for step in plan.steps]
+    assert kinds[:3] == ["declare", "add_edges", "bind"]
+    assert len(plan.steps[1][2]) == 3
+
+
+def test_bindings_compile_once():
+    plan = Plan(PROGRAM)
+    q = ("var", "q")
+    p = ("var", "p")
+    assert plan.compiler.dfa(q) is plan.compiler.dfa(q)
+    assert plan.compiler.rsm(p) is plan.compiler.rsm(p)
+
+
+def test_precedence():
+    [(_, _, expr)] = parse_program('let x = "a" . "b" ^ [2] | "c" & "d"')
+    assert expr == (
+        "union",
+        ("concat", ("char", "a"), ("repeat", ("char", "b"), 2, 2)),
+        ("inter", ("char", "c"), ("char", "d")),
+    )
+
+
+@pytest.mark.parametrize(
+    "program, well_typed",
+    [
+        ('let q = "a" . p\nlet p = "b"', True),
+        ('let p = "a" . p | "b"\nlet q = p & p', False),
+        ('let p = 1\nlet q = "a" . p', False),
+        ("let g is graph\nadd edge (1, 2, 3) to g", False),
+        (
+            'let g is graph\nlet r = for x in [1] return v where u reachable from v in g by "a"',
+            False,
+        ),
+        ('let g = "a" .', False),
+    ],
+)
+def test_typing(program, well_typed):
+    assert typing_program(program) == well_typed
+
+
+@pytest.mark.parametrize("engine", CFPQ_ENGINES)
+def test_engines_agree_with_matrix(monkeypatch, engine):
+    force_engine(monkeypatch, engine)
+    rng = random.Random(5)
+    edges = [
+        (rng.randrange(30), rng.choice("ab"), rng.randrange(30)) for _ in range(80)
+    ]
+    starts, finals = {0, 1, 2, 3}, {0, 5, 7, 9, 11}
+    program = "let g is graph\n" + "\n".join(
+        f'add edge ({u}, "{l}", {v}) to g' for u, l, v in edges
+    )
+    program += f"""
+let s = "a" . s . "b" | "a" ^ [0..0]
+let r = for v in {sorted(starts)} for u in {sorted(finals)} return u, v
+    where u reachable from v in g by s
+"""
+
+    expected = cfpq_with_matrix(
+        CFG.from_text("S -> a S b | $"), LabeledGraph.from_edges(edges), starts, finals
+    )
+    assert exec_program(program)["r"] == expected
+
+
+def force_engine(monkeypatch, engine):
+    weights = {e: [0.0 if e == engine else 1.0, 0.0] for e in CFPQ_ENGINES}
+    monkeypatch.setattr(task12, "_cost_model", CfpqCostModel(weights))
+
+
+def count_engine_calls(monkeypatch):
+    calls = []
+    matrix = task12.cfpq_with_matrix
+
+    def counted(*args, **kwargs):
+        calls.append(args[2])
+        return matrix(*args, **kwargs)
+
+    force_engine(monkeypatch, "matrix")
+    monkeypatch.setattr(task12, "cfpq_with_matrix", counted)
+    return calls
+
+
+BATCH = """
+let g is graph
+add edge (1, "a", 2) to g
+add edge (2, "b", 3) to g
+add edge (4, "a", 5) to g
+add edge (5, "b", 6) to g
+let s = "a" . s . "b" | "a" . "b"
+let r1 = for v in [1] return u, v where u reachable from v in g by s
+let r2 = for v in [4] for u in [3, 6] return u, v where u reachable from v in g by s
+let r3 = for v in [2, 4] return u where u reachable from v in g by s
+"""
+
+
+def test_selects_sharing_a_query_make_one_engine_call(monkeypatch):
+    calls = count_engine_calls(monkeypatch)
+    plan = Plan(BATCH)
+    assert [step[0] for step in plan.steps][-1:] == ["selects"]
+    assert plan.run() == {"r1": {(1, 3)}, "r2": {(4, 6)}, "r3": {6}}
+    assert calls == [{1, 2, 4}]
+
+
+def test_dependent_selects_and_graph_changes_split_batches(monkeypatch):
+    calls = count_engine_calls(monkeypatch)
+    program = (
+        BATCH
+        + """
+let r4 = for v in r3 return v where u reachable from v in g by s
+let n = 1
+let r5 = for v in r3 return v where u reachable from v in g by s
+add edge (6, "b", 7) to g
+let r6 = for v in r3 return v where u reachable from v in g by s
+"""
+    )
+    results = exec_program(program)
+    assert results["r4"] == results["r5"] == results["r6"] == set()
+    # r4 waits for r3, r5 reuses the answer of r4, r6 sees a new graph
+    assert calls == [{1, 2, 4}, {6}, {6}]
+
+
+def test_explain_reports_plans():
+    plans = explain_program(PROGRAM)
+    assert set(plans) == {"r1", "r2", "r3", "r4", "r5", "r6"}
+    assert plans["r1"]["type"] == "fa" and plans["r1"]["engine"] == "rpq"
+    assert plans["r1"]["strategy"] in ("all_pairs", "multiple_source")
+    assert plans["r2"]["type"] == "rsm" and plans["r2"]["engine"] in CFPQ_ENGINES
+    assert plans["r2"]["cost"] == min(plans["r2"]["costs"].values())
+    assert plans["r2"]["labels"] == {"a": 2, "b": 1}
+    assert plans["r6"]["nodes"] == 2
+
+
+def test_cost_model_prefers_gll_for_few_starts_on_sparse_graphs():
+    shape = {"boxes": 1, "productions": 2, "states": 7, "alternatives": 2}
+    model = CfpqCostModel()
+    assert model.choose(10000, 5000, shape, 1) == "gll"
+    assert model.choose(10000, 30000, shape, 10000) != "gll"
+    assert model.choose(10000, 30000, shape, 10000) != "hellings"
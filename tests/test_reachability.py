@@ -0,0 +1,65 @@
+import networkx as nx
+import pytest
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton
+from project.task4 import reachability_with_constraints
+
+
+@pytest.fixture()
+def graph():
+    G = nx.MultiDiGraph()
+    G.add_edges_from(
+        [
+            (0, 1, {"label": "a"}),
+            (1, 2, {"label": "a"}),
+            (2, 0, {"label": "b"}),
+            (2, 3, {"label": "c"}),
+        ]
+    )
+    return G
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_multiple_sources(graph, lazy):
+    fa = FiniteAutomaton.from_graph(graph, {0, 1, 2}, {0, 2, 3})
+    constraints_fa = FiniteAutomaton(regex_to_dfa("(a a b)* a a c"))
+
+    result = reachability_with_constraints(fa, constraints_fa, lazy=lazy)
+
+    assert result[0] == {3}
+    assert result[1] == set()
+    assert result[2] == set()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_empty_path_for_final_start(graph, lazy):
+    fa = FiniteAutomaton.from_graph(graph, {0, 1}, {0, 2})
+    constraints_fa = FiniteAutomaton(regex_to_dfa("a*"))
+
+    result = reachability_with_constraints(fa, constraints_fa, lazy=lazy)
+
+    assert result[0] == {0, 2}
+    assert result[1] == {2}
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_no_common_labels(graph, lazy):
+    fa = FiniteAutomaton.from_graph(graph, {0, 1}, {0, 1, 2})
+    constraints_fa = FiniteAutomaton(regex_to_dfa("d*"))
+
+    result = reachability_with_constraints(fa, constraints_fa, lazy=lazy)
+
+    assert result[0] == {0}
+    assert result[1] == {1}
+    assert result[2] == set()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_empty_start_set(graph, lazy):
+    fa = FiniteAutomaton.from_graph(graph, {0}, {1})
+    fa.start_states = set()
+    constraints_fa = FiniteAutomaton(regex_to_dfa("a"))
+
+    result = reachability_with_constraints(fa, constraints_fa, lazy=lazy)
+
+    assert all(len(reached) == 0 for reached in result.values())
@@ -0,0 +1,26 @@
+from project.task2 import RegexCache
+
+
+def test_lru_and_counters():
+    cache = RegexCache(maxsize=2)
+
+    dfa = cache.get("a b*")
+    assert cache.get("  a   b* ") is dfa
+    cache.get("c")
+    cache.get("a b*")
+    cache.get("d")
+
+    assert cache.info() == {"hits": 2, "misses": 3, "size": 2, "maxsize": 2}
+    cache.get("c")
+    assert cache.misses == 4
+
+
+def test_disk_store(tmp_path):
+    path = str(tmp_path / "regex.pickle")
+    RegexCache(path=path).get("(a | b)* c")
+
+    warm = RegexCache(path=path)
+    dfa = warm.get("(a | b)* c")
+
+    assert warm.info()["hits"] == 1 and warm.misses == 0
+    assert dfa.accepts("abac") and not dfa.accepts("ab")
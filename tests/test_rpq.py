@@ -0,0 +1,48 @@
+import cfpq_data
+import pytest
+from project.task5 import RpqCostModel, calibrate_rpq, rpq
+from project.graph import LabeledGraph
+from project.task2 import regex_to_dfa
+from project.task3 import FiniteAutomaton, paths_ends
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return cfpq_data.graphs.labeled_scale_free_graph(50, labels=["a", "b"], seed=5)
+
+
+@pytest.mark.parametrize("regex", ["a*", "a b", "(a | b)* b", "c"])
+@pytest.mark.parametrize("strategy", [None, "all_pairs", "multiple_source"])
+def test_strategies_agree(graph, regex, strategy):
+    starts, finals = {0, 3, 7, 11, 100}, set(range(0, 50, 2)) | {100}
+
+    expected = set(paths_ends(graph, starts, finals, regex))
+
+    assert rpq(graph, regex, starts, finals, strategy=strategy) == expected
+
+
+def test_choice_follows_weights():
+    graph = LabeledGraph.from_edges([(0, "a", 1), (1, "a", 2)])
+    dfa_fa = FiniteAutomaton(regex_to_dfa("a*"))
+
+    sources_expensive = RpqCostModel(
+        {"all_pairs": [2, 0, 0, 0], "multiple_source": [0, 1, 0]}
+    )
+    assert sources_expensive.choose(graph, dfa_fa, 1) == "multiple_source"
+    assert sources_expensive.choose(graph, dfa_fa, 3) == "all_pairs"
+
+
+def test_calibrate():
+    model = calibrate_rpq(
+        sizes=(30, 60), regexes=("a*", "a b"), start_fractions=(0.1, 1.0), install=False
+    )
+
+    assert all(w >= 0 for ws in model.weights.values() for w in ws)
+    assert set(
+        model.estimate(
+            LabeledGraph.from_edges([]), FiniteAutomaton(regex_to_dfa("a")), 1
+        )
+    ) == {
+        "all_pairs",
+        "multiple_source",
+    }
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+from project.graph import LabeledGraph
+from project.task3 import paths_ends
+from project.task4 import RpqView
+
+
+def random_edges(rng, n, count):
+    return [
+        (rng.randrange(n), rng.choice("abc"), rng.randrange(n)) for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("regex", ["a* b", "(a | b)* c", "a b* a", "c*"])
+@pytest.mark.parametrize("starts", [None, {0, 3, 5, 13}])
+@pytest.mark.parametrize("backend", ["csr", "bits"])
+def test_insertions_match_recomputation(regex, starts, backend):
+    rng = random.Random(3)
+    edges = random_edges(rng, 10, 15)
+    graph = LabeledGraph.from_edges(edges, nodes=range(10))
+    view = RpqView(graph, regex, starts, backend)
+
+    for _ in range(8):
+        added = random_edges(rng, 14, 2)
+        edges += added
+        view.add_edges(added)
+
+        all_nodes = set(graph.nodes)
+        expected = set(paths_ends(graph, starts or all_nodes, all_nodes, regex))
+        if starts is not None:
+            expected = {(s, f) for s, f in expected if s in starts}
+        assert view.query() == expected
+
+
+def test_query_filters_and_external_changes():
+    graph = LabeledGraph.from_edges([(0, "a", 1), (1, "b", 2)])
+    view = RpqView(graph, "a b")
+    assert view.query() == {(0, 2)}
+    assert view.query({1}) == set()
+    assert view.query({0}, {1}) == set()
+
+    graph.remove_edges([(1, "b", 2)])
+
+    assert view.query() == set()
@@ -0,0 +1,41 @@
+import cfpq_data
+import pytest
+from pyformlang.cfg import CFG
+from project.task6 import cfpq_with_hellings, iter_cfpq_with_hellings
+from project.task7 import cfpq_with_matrix, iter_cfpq_with_matrix
+from project.task8 import cfpq_with_tensor, iter_cfpq_with_tensor
+from project.task9 import cfpq_with_gll, iter_cfpq_with_gll
+
+ENGINES = [
+    (cfpq_with_hellings, iter_cfpq_with_hellings),
+    (cfpq_with_matrix, iter_cfpq_with_matrix),
+    (cfpq_with_tensor, iter_cfpq_with_tensor),
+    (cfpq_with_gll, iter_cfpq_with_gll),
+]
+DYCK = CFG.from_text("S -> a S b S | $")
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return cfpq_data.graphs.labeled_scale_free_graph(40, labels=["a", "b"], seed=2)
+
+
+@pytest.mark.parametrize("engine, iter_engine", ENGINES)
+def test_stream_matches_set(graph, engine, iter_engine):
+    starts, finals = set(range(0, 40, 2)), set(range(25))
+
+    pairs = list(iter_engine(DYCK, graph, starts, finals))
+
+    assert len(pairs) == len(set(pairs))
+    assert set(pairs) == engine(DYCK, graph, starts, finals)
+
+
+@pytest.mark.parametrize("engine, iter_engine", ENGINES)
+def test_limit(graph, engine, iter_engine):
+    expected = engine(DYCK, graph)
+
+    pairs = list(iter_engine(DYCK, graph, limit=5))
+
+    assert len(pairs) == 5
+    assert set(pairs) <= expected
+    assert list(iter_engine(DYCK, graph, limit=0)) == []